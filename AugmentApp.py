@@ -1,14 +1,26 @@
 import os
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, 
-    QLabel, QPushButton, QFileDialog, QWidget, QProgressBar, QSpinBox
+    QLabel, QPushButton, QFileDialog, QWidget, QProgressBar, QSpinBox, QComboBox, QCheckBox
 )
-from PyQt5.QtCore import Qt, QEvent
+from PyQt5.QtCore import Qt, QEvent, QTimer
+from PyQt5.QtGui import QPixmap
 from AugmentationSettingsDialog import AugmentationSettingsDialog
 from Modes import Modes
 from ImageAugmentor import ImageAugmentor
 from AugmentationThread import AugmentationThread
+from AugmentationEngine import AugmentationEngine
+from FrameResizer import FrameResizer
 from Utilities import Utilities
+from ImageCache import ImageCache
+from ShardReader import ShardReader
+from DatasetIndex import DatasetIndex
+from DatasetIndexThread import DatasetIndexThread
+from DecodedStore import DecodedStore
+from DetectionWorker import DetectionWorker
+from LabelCache import LabelCache
+from PreviewRenderer import PreviewRenderer
 from YoloModel import YoloModel
 
 class DataAugmentationApp(QMainWindow):
@@ -17,9 +29,26 @@ class DataAugmentationApp(QMainWindow):
     DEFAULT_PROBABILITY = 0.3
     DEFAULT_AUG_PER_IMAGE = 3
     DEFAULT_WORKERS = 12
-    MIN_WORKERS = 1
+    MIN_WORKERS = AugmentationEngine.AUTO_WORKERS     # Минимум спинбокса означает автоподбор
     MAX_WORKERS = 64
+    BACKEND_NAMES = {
+        AugmentationEngine.BACKEND_THREAD: "Потоки",
+        AugmentationEngine.BACKEND_PROCESS: "Процессы",
+    }
+    RESIZE_MODE_NAMES = {
+        FrameResizer.MODE_FIT: "Вписать",
+        FrameResizer.MODE_LETTERBOX: "Letterbox",
+    }
+    MAX_TOTAL_VARIANTS = 10_000_000
+    MAX_TARGET_SIZE = 8192
+    TARGET_SIZE_STEP = 32
     MANUAL_SAVE_DIRECTORY = "saved"
+    CACHE_SIZE_MB = 512
+    PREFETCH_RADIUS = 3
+    PROFILE_TOP = 5     # Строк в живой сводке профилирования
+    # Пороги остановки запуска из-за ошибок; ниже порогов файлы с ошибками пропускаются
+    MAX_ERRORS = None
+    MAX_ERROR_RATE = 0.5
 
     def __init__(self):
         super().__init__()
@@ -31,27 +60,50 @@ class DataAugmentationApp(QMainWindow):
         self.original_image = None
         self.augmented_image = None
         self.current_index = 0
-        self.pipeline = None
         self.mode = Modes.ONLY_IMAGES
         self.augmentations_per_image = self.DEFAULT_AUG_PER_IMAGE
         self.workers = self.DEFAULT_WORKERS
+        self.backend = AugmentationEngine.BACKEND_THREAD
+        self.profile = False
+        self.error_count = 0
+        self.target_size = None     # None - исходный размер кадров
+        self.resize_mode = FrameResizer.MODE_FIT
+        self.balance_classes = False
+        self.hard_examples = False
+        self.total_variants = None     # None - число изображений × augmentations_per_image
         self.yolo_model = YoloModel()
-
-        # Состояния параметров аугментации (все включены по умолчанию)
-        self.augmentation_settings = {
-            aug: {"enabled": True, "probability": self.DEFAULT_PROBABILITY} for aug in [
-                "Affine", "CLAHE", "ChannelShuffle", "ChromaticAberration",
-                "CoarseDropout", "ColorJitter", "D4", "Downscale",
-                "HueSaturationValue", "ISONoise", "Morphological",
-                "MotionBlur", "OpticalDistortion",
-                "PixelDropout", "RGBShift", "RandomBrightnessContrast",
-                "RandomGamma", "RandomGravel", "RandomRain", "Sharpen", "Spatter"
-            ]
-        }
-        self.pipeline = ImageAugmentor.update_pipeline(self.augmentation_settings, self.mode)
-
+        self.shard_reader = None
+        self.decoded_store = None
+        self.label_cache = None
+        self.dataset_index = None
+        self.index_thread = None
+        self.image_cache = ImageCache(self.load_image_with_labels, self.CACHE_SIZE_MB, self.image_signature)
+
+        self.augmentation_settings = ImageAugmentor.default_settings(self.DEFAULT_PROBABILITY)
         self.initUI()
 
+        # Превью готовится в фоне; показывается только ответ на последний запрос
+        self.render_token = 0
+        self.shown_token = None
+        self.render_request = None
+        self.renderer = PreviewRenderer(self.PREVIEW_WIDTH)
+        self.renderer.rendered.connect(self.on_rendered)
+        self.renderer.saved.connect(lambda path: Utilities.show_message(f"Успешно сохранено!"))
+        self.renderer.error.connect(Utilities.show_error_message)
+        self.renderer.start()
+
+        # Seed превью каждого изображения: при возврате показывается тот же вариант
+        # (и обнаружение на нем берется из кэша); "Обновить" выбирает новый
+        self.preview_seeds = {}
+        self.detector = DetectionWorker(self.yolo_model)
+        self.detector.detected.connect(self.on_detected)
+        self.detector.loaded.connect(lambda path: Utilities.show_message(f"Модель {path} загружена успешно!"))
+        self.detector.error.connect(Utilities.show_error_message)
+        self.detector.start()
+
+        # Тяжелые зависимости подгружаются в фоне уже после появления окна
+        QTimer.singleShot(0, self.start_preload)
+
     def initUI(self):
         layout = QVBoxLayout()
 
@@ -80,10 +132,53 @@ class DataAugmentationApp(QMainWindow):
 
         self.threads_spinbox = QSpinBox()
         self.threads_spinbox.setRange(self.MIN_WORKERS, self.MAX_WORKERS)  
+        self.threads_spinbox.setSpecialValueText("Авто")
         self.threads_spinbox.setValue(self.DEFAULT_WORKERS) 
         self.threads_spinbox.valueChanged.connect(self.update_workers)   
         start_layout.addWidget(self.threads_spinbox)
 
+        self.backend_combobox = QComboBox()
+        for backend, name in self.BACKEND_NAMES.items():
+            self.backend_combobox.addItem(name, backend)
+        self.backend_combobox.currentIndexChanged.connect(self.update_backend)
+        start_layout.addWidget(self.backend_combobox)
+
+        # Целевой размер кадров: 0 - без изменения размера
+        self.target_size_spinbox = QSpinBox()
+        self.target_size_spinbox.setRange(0, self.MAX_TARGET_SIZE)
+        self.target_size_spinbox.setSingleStep(self.TARGET_SIZE_STEP)
+        self.target_size_spinbox.setSpecialValueText("Исходный размер")
+        self.target_size_spinbox.setSuffix(" px")
+        self.target_size_spinbox.valueChanged.connect(self.update_target_size)
+        start_layout.addWidget(self.target_size_spinbox)
+
+        self.resize_mode_combobox = QComboBox()
+        for resize_mode, name in self.RESIZE_MODE_NAMES.items():
+            self.resize_mode_combobox.addItem(name, resize_mode)
+        self.resize_mode_combobox.currentIndexChanged.connect(self.update_resize_mode)
+        start_layout.addWidget(self.resize_mode_combobox)
+
+        self.balance_checkbox = QCheckBox("Баланс классов")
+        self.balance_checkbox.toggled.connect(self.update_balance_classes)
+        start_layout.addWidget(self.balance_checkbox)
+
+        # Варианты только для изображений, на которых загруженная модель ошибается
+        self.hard_examples_checkbox = QCheckBox("Сложные примеры")
+        self.hard_examples_checkbox.toggled.connect(self.update_hard_examples)
+        start_layout.addWidget(self.hard_examples_checkbox)
+
+        # Бюджет вариантов на весь датасет: 0 - как при одинаковом числе на изображение
+        self.total_variants_spinbox = QSpinBox()
+        self.total_variants_spinbox.setRange(0, self.MAX_TOTAL_VARIANTS)
+        self.total_variants_spinbox.setSpecialValueText("Всего: по настройке")
+        self.total_variants_spinbox.setPrefix("Всего: ")
+        self.total_variants_spinbox.valueChanged.connect(self.update_total_variants)
+        start_layout.addWidget(self.total_variants_spinbox)
+
+        self.profile_checkbox = QCheckBox("Профилирование")
+        self.profile_checkbox.toggled.connect(self.update_profile)
+        start_layout.addWidget(self.profile_checkbox)
+
         layout.addLayout(start_layout)
 
         # Кнопка "Остановить аугментацию" (по умолчанию скрыта)
@@ -97,6 +192,15 @@ class DataAugmentationApp(QMainWindow):
         self.progress_bar.setValue(0)  # Начальное значение
         layout.addWidget(self.progress_bar)
 
+        self.error_label = QLabel()
+        self.error_label.setVisible(False)
+        layout.addWidget(self.error_label)
+
+        # Живая сводка профилирования (видна только при включенном профилировании)
+        self.profile_label = QLabel()
+        self.profile_label.setVisible(False)
+        layout.addWidget(self.profile_label)
+
         self.image_layout = QHBoxLayout()
         self.original_image_label = QLabel("Исходное изображение")
         self.augmented_image_label = QLabel("Аугментированное изображение")
@@ -143,45 +247,84 @@ class DataAugmentationApp(QMainWindow):
 
         return super(DataAugmentationApp, self).keyPressEvent(event)
 
+    def start_preload(self):
+        threading.Thread(target=ImageAugmentor.preload, name="preload", daemon=True).start()
+
     def update_workers(self, value):
         self.workers = value
 
+    def update_backend(self, index):
+        self.backend = self.backend_combobox.itemData(index)
+
+    def update_profile(self, checked):
+        self.profile = checked
+
+    def update_target_size(self, value):
+        self.target_size = value or None
+
+    def update_resize_mode(self, index):
+        self.resize_mode = self.resize_mode_combobox.itemData(index)
+
+    def update_balance_classes(self, checked):
+        self.balance_classes = checked
+
+    def update_hard_examples(self, checked):
+        self.hard_examples = checked
+
+    def update_total_variants(self, value):
+        self.total_variants = value or None
+
     def start_augmentation(self):
         if not self.directory:
             Utilities.show_error_message("Выберите директорию перед началом аугментации.")
             return
 
-        images_dir = os.path.join(self.directory, "images")
-        labels_dir = os.path.join(self.directory, "labels")
-        output_images_dir = os.path.join(self.directory, "augmented_images")
-        output_labels_dir = os.path.join(self.directory, "augmented_labels")
+        if self.shard_reader is not None:
+            Utilities.show_error_message("Архив шардов открыт только для просмотра. Выберите директорию датасета.")
+            return
 
-        # Создаем директории для сохранения результатов
-        os.makedirs(output_images_dir, exist_ok=True)
-        if self.mode == Modes.IMAGES_WITH_LABELS:
-            os.makedirs(output_labels_dir, exist_ok=True)
+        if self.is_indexing():
+            Utilities.show_error_message("Индексация директории еще не завершена.")
+            return
+
+        if self.hard_examples and self.mode != Modes.IMAGES_WITH_LABELS:
+            Utilities.show_error_message("Для отбора сложных примеров нужна разметка (images/ + labels/).")
+            return
 
         # Инициализируем поток
         self.augmentation_thread = AugmentationThread(
             self.directory,
             self.image_paths,
-            labels_dir,
-            output_images_dir,
-            output_labels_dir,
-            self.pipeline,
+            self.augmentation_settings,
             self.mode,
             self.augmentations_per_image,
             self.workers,
+            self.backend,
+            self.profile,
+            self.target_size,
+            self.resize_mode,
+            self.balance_classes,
+            self.total_variants,
+            self.MAX_ERRORS,
+            self.MAX_ERROR_RATE,
+            self.hard_examples,
+            self.yolo_model,
         )
         self.augmentation_thread.progress.connect(self.progress_bar.setValue)
-        self.augmentation_thread.error.connect(Utilities.show_error_message)
+        # Во время запуска ошибки только подсчитываются, сводка - в итоговом сообщении
+        self.augmentation_thread.error.connect(self.on_augmentation_error)
         self.augmentation_thread.finished.connect(self.on_augmentation_finished)
         self.augmentation_thread.progress_preview.connect(self.preview_progress)
+        self.augmentation_thread.profile_summary.connect(self.show_profile_summary)
 
         # Блокируем интерфейс
         self.start_button.setEnabled(False)
         self.progress_bar.setValue(0)
         self.stop_button.setVisible(True)
+        self.profile_label.clear()
+        self.profile_label.setVisible(self.profile)
+        self.error_count = 0
+        self.error_label.setVisible(False)
 
         # Запускаем поток
         self.augmentation_thread.start()
@@ -190,7 +333,31 @@ class DataAugmentationApp(QMainWindow):
         self.start_button.setEnabled(True)
         self.progress_bar.setValue(0)
         self.stop_button.setVisible(False)
-        Utilities.show_message(f"Аугментация завершена!\nПолучено изображений: {count}/{total_count}\nВремени затрачено: {time:.2f} с")
+        stats = self.augmentation_thread.engine.stats
+        Utilities.show_message(
+            f"Аугментация завершена!\nПолучено изображений: {count}/{total_count}\nВремени затрачено: {time:.2f} с"
+            f"\nКадров превью показано/пропущено: {stats.get('preview_sent', 0)}/{stats.get('preview_skipped', 0)}"
+            f"\nЗаписано: {stats.get('bytes_written', 0) / 1024 / 1024:.1f} МБ, кодирование: {stats.get('encode_time', 0):.2f} с"
+            f"\nПропущено готовых вариантов: {stats.get('resumed_variants', 0)}"
+            f"\nНеудачных попыток/вариантов: {stats.get('failed_attempts', 0)}/{stats.get('failed_variants', 0)}"
+            + (f"\nСложные примеры: оценено {stats['hard_examples']['scored']}, простых пропущено {stats['hard_examples']['easy']}"
+               if 'hard_examples' in stats else "")
+            + (f"\nПлан: {stats['plan']['variants']} вариантов для {stats['plan']['scheduled_images']} изображений, {stats['plan_path']}"
+               if 'plan' in stats else "")
+            + (f"\nИсправлена разметка в {stats['label_files_repaired']} файлах, отчет: {stats['label_report']}"
+               if 'label_report' in stats else "")
+            + (f"\nАвтоподбор: воркеров {stats['autotune']['workers']}, потоков OpenCV {stats['autotune']['library_threads']}"
+               if 'autotune' in stats else "")
+            + (f"\nОтчет профилирования: {stats['profile_report']}" if 'profile_report' in stats else "")
+            + (f"\n{self.augmentation_thread.engine.errors.format_summary()}"
+               if self.augmentation_thread.engine.errors.total else "")
+            + (f"\nОтчет об ошибках: {stats['error_report']}" if 'error_report' in stats else "")
+        )
+
+    def on_augmentation_error(self, message):
+        self.error_count += 1
+        self.error_label.setText(f"Ошибок: {self.error_count}")
+        self.error_label.setVisible(True)
 
     def stop_augmentation(self):
         if self.augmentation_thread and self.augmentation_thread.isRunning():
@@ -203,52 +370,107 @@ class DataAugmentationApp(QMainWindow):
         self.stop_button.setVisible(False)
         Utilities.show_message("Аугментация была остановлена пользователем.")
 
+    def show_profile_summary(self, report):
+        lines = [
+            f"{name}: {timing['total_s']:.2f} с, {timing['count']} шт., p50 {timing['p50_ms']:.1f} мс, p99 {timing['p99_ms']:.1f} мс"
+            for name, timing in list(report.items())[:self.PROFILE_TOP]
+        ]
+        self.profile_label.setText("\n".join(lines))
+
     def preview_progress(self, orig_image, orig_bboxes, aug_image, aug_bboxes):
         self.display_image(orig_image, orig_bboxes, self.original_image_label)
         self.display_image(aug_image, aug_bboxes, self.augmented_image_label)
 
     def select_directory(self):
-        self.directory = QFileDialog.getExistingDirectory(self, "Выберите директорию")
+        self.open_directory(QFileDialog.getExistingDirectory(self, "Выберите директорию"))
+
+    def open_directory(self, directory):
+        self.directory = directory
         if self.directory:
             self.dir_label.setText(f"Активная директория: {self.directory}")
             
-            self.mode = Utilities.determine_mode(self.directory)
-            if self.mode == Modes.IMAGES_WITH_LABELS:
-                self.image_paths = [
-                    os.path.join(self.directory, "images", f) for f in os.listdir(os.path.join(self.directory, "images"))
-                    if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))
-                ]
-            elif self.mode == Modes.ONLY_IMAGES:
-                self.image_paths = [
-                    os.path.join(self.directory, f) for f in os.listdir(self.directory)
-                    if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))
-                ]
+            # Директория с шардами (augmented_shards) открывается только для просмотра
+            if ShardReader.is_archive(self.directory):
+                self.shard_reader = ShardReader(self.directory)
+                self.mode = Modes.IMAGES_WITH_LABELS if self.shard_reader.has_labels() else Modes.ONLY_IMAGES
+                self.image_paths = self.shard_reader.image_paths()
+            else:
+                # Сразу показывается последний сохраненный индекс, актуальный строится в фоне
+                self.shard_reader = None
+                self.mode = Utilities.determine_mode(self.directory)
+                self.dataset_index = DatasetIndex.open(self.directory, self.mode)
+                self.image_paths = self.dataset_index.image_paths() if self.dataset_index is not None else []
+                self.start_indexing()
+            self.decoded_store = DecodedStore.open(self.directory) if self.shard_reader is None else None
+            self.label_cache = LabelCache.open(self.directory) if self.mode == Modes.IMAGES_WITH_LABELS and self.shard_reader is None else None
             
             self.current_index = 0
-            self.pipeline = ImageAugmentor.update_pipeline(self.augmentation_settings, self.mode)
+            self.image_cache.clear()
+            self.show_image_pair()
+
+    def start_indexing(self):
+        self.dir_label.setText(f"Активная директория: {self.directory} (индексация...)")
+        self.index_thread = DatasetIndexThread(self.directory, self.mode)
+        self.index_thread.indexed.connect(self.on_indexed)
+        self.index_thread.progress.connect(self.on_index_progress)
+        self.index_thread.error.connect(Utilities.show_error_message)
+        self.index_thread.start()
+
+    def is_indexing(self):
+        return self.index_thread is not None and self.index_thread.isRunning()
+
+    def on_index_progress(self, done, total):
+        self.dir_label.setText(f"Активная директория: {self.directory} (индексация: {done}/{total})")
+
+    def on_indexed(self, index):
+        # Индекс ранее открытой директории не нужен
+        if index.directory != self.directory or self.shard_reader is not None:
+            return
+
+        current_path = self.image_paths[self.current_index] if self.has_valid_image_paths() else None
+        self.dataset_index = index
+        self.image_paths = index.image_paths()
+        summary = index.summary()
+        self.dir_label.setText(
+            f"Активная директория: {self.directory} ({summary['images']} изображений, с разметкой: {summary['labeled']})"
+        )
+        row = index.rows.get(os.path.relpath(current_path, self.directory)) if current_path is not None else None
+        if row is not None:
+            # Текущее изображение остается на экране
+            self.current_index = row
+        else:
+            self.current_index = 0
             self.show_image_pair()
 
     def open_settings(self):
         dialog = AugmentationSettingsDialog(self, self.augmentation_settings, self.augmentations_per_image)
         if dialog.exec_():
             self.augmentation_settings, self.augmentations_per_image = dialog.get_updated_settings()
-            self.pipeline = ImageAugmentor.update_pipeline(self.augmentation_settings, self.mode)
             self.show_image_pair()
 
     def load_weights(self):
         weights_path, _ = QFileDialog.getOpenFileName(self, "Select YOLO Weights", "", "Weights Files (*.pt)")
         if weights_path:
-            self.yolo_model.load_weights(weights_path)
+            self.detector.load_weights(weights_path)
 
     def detect(self):
-        if self.augmented_image is None:
+        # Пока превью текущего изображения не готово, обнаруживать не на чем
+        if self.augmented_image is None or self.shown_token != self.render_token:
             return
         
-        ok, detected_image, bboxes = self.yolo_model.detect(self.augmented_image)
-        if ok:
-            self.display_image(detected_image, bboxes, self.augmented_image_label, (255, 0, 0))
+        self.detector.detect(self.render_token, self.augmented_image)
+
+    def on_detected(self, result):
+        # Обнаружение для уже пролистанного изображения не показывается
+        if result["token"] != self.render_token:
+            return
+        if not len(result["bboxes"]):
+            Utilities.show_message("Ничего не обнаружено")
+        self.display_image(self.augmented_image, result["bboxes"], self.augmented_image_label, (255, 0, 0))
     
     def update_augment_image(self):
+        if self.has_valid_image_paths():
+            self.preview_seeds.pop(self.image_paths[self.current_index], None)
         self.show_image_pair()
     
     def save_augment_image(self):
@@ -256,43 +478,98 @@ class DataAugmentationApp(QMainWindow):
             Utilities.show_error_message("Выберите директорию перед началом аугментации.")
             return
         
+        if self.render_request is None:
+            return
+
         save_directory = os.path.join(self.directory, self.MANUAL_SAVE_DIRECTORY)
         os.makedirs(save_directory, exist_ok=True)
-        if Utilities.save_image(self.augmented_image, save_directory):
-            Utilities.show_message(f"Успешно сохранено!")
+        # Вариант пересчитывается в полном разрешении с тем же seed; превью заменится на сохраненный
+        self.renderer.save(self.render_request, save_directory)
         
     def show_image_pair(self):
         if not self.has_valid_image_paths():
             return
 
-        original_path = self.image_paths[self.current_index]
-        
-        self.original_image = Utilities.open_image(original_path)
-        if self.original_image is None:
-            return
-
-        bboxes, labels = Utilities.process_labels(self.mode, self.directory, original_path)
-        
-        self.display_image(self.original_image, bboxes, self.original_image_label)
+        self.render_token += 1
+        self.detector.cancel()
+        image_path = self.image_paths[self.current_index]
+        self.render_request = {
+            "token": self.render_token,
+            "image_path": image_path,
+            "load": self.image_cache.get,
+            "load_full": self.load_full_image_with_labels,
+            "settings": self.augmentation_settings,
+            "mode": self.mode,
+            "seed": self.preview_seeds.setdefault(image_path, PreviewRenderer.new_seed()),
+        }
+        self.renderer.render(self.render_request)
+        self.prefetch_neighbours()
 
-        ok, self.augmented_image, augmented_bboxes, augmented_labels = Utilities.attempt_augmentation(self.pipeline, self.original_image, bboxes, labels)
-        
-        self.display_image(self.augmented_image, augmented_bboxes, self.augmented_image_label)
+    def on_rendered(self, result):
+        # Ответ на устаревший запрос (пользователь уже перелистнул) не показывается
+        if result["token"] != self.render_token:
+            return
 
+        self.shown_token = result["token"]
+        self.original_image = result["image"]
+        self.augmented_image = result["augmented_image"]
+        self.original_image_label.setPixmap(QPixmap.fromImage(result["original"]))
+        self.augmented_image_label.setPixmap(QPixmap.fromImage(result["augmented"]))
         self.adjust_widget_sizes()
 
+    def load_image_with_labels(self, image_path):
+        # Для превью кадр декодируется уменьшенным (PreviewRenderer.read_reduced)
+        return self.load_full_image_with_labels(image_path, reduced=True)
+
+    def load_full_image_with_labels(self, image_path, reduced=False):
+        if self.shard_reader is not None:
+            image, bboxes, labels = self.shard_reader.read(image_path)
+            image = PreviewRenderer.reduce(image) if reduced else image
+            return (image, bboxes, labels) if self.mode == Modes.IMAGES_WITH_LABELS else (image, None, None)
+
+        if self.decoded_store is not None:
+            stored = self.decoded_store.get(self.mode, image_path)
+            if stored is not None:
+                return (PreviewRenderer.reduce(stored[0]), *stored[1:]) if reduced else stored
+
+        if reduced:
+            size = self.dataset_index.image_size(image_path) if self.dataset_index is not None else None
+            image = PreviewRenderer.read_reduced(image_path, size=size)
+        else:
+            image = Utilities.read_image(image_path)
+        if self.label_cache is not None:
+            bboxes, labels = self.label_cache.load_labels(self.mode, image_path)
+        else:
+            bboxes, labels = Utilities.load_labels(self.mode, self.directory, image_path)
+        return image, bboxes, labels
+
+    def image_signature(self, image_path):
+        if self.shard_reader is not None:
+            return self.shard_reader.signature(image_path)
+        # Изменение файла разметки тоже делает запись кэша устаревшей
+        return Utilities.sources_signature(self.mode, self.directory, image_path)
+
+    def prefetch_neighbours(self):
+        # Фоновое декодирование соседних изображений для быстрой навигации
+        start = max(0, self.current_index - self.PREFETCH_RADIUS)
+        end = min(len(self.image_paths), self.current_index + self.PREFETCH_RADIUS + 1)
+        neighbours = sorted(range(start, end), key=lambda index: abs(index - self.current_index))
+        self.image_cache.prefetch([self.image_paths[index] for index in neighbours if index != self.current_index])
+
     def has_valid_image_paths(self):
         if not self.image_paths: return False
         else: return self.image_paths    
 
     def display_image(self, image, bboxes, label_widget, color=(0, 255, 0)):
-        if bboxes:
-            image = Utilities.draw_boxes(image, bboxes, color)
-
-        pixmap = Utilities.numpy_to_pixmap(image, self.PREVIEW_WIDTH, self.PREVIEW_HEIGHT).scaled(
-            self.PREVIEW_WIDTH, self.PREVIEW_HEIGHT, Qt.KeepAspectRatio
-        )
-        label_widget.setPixmap(pixmap)
+        # Кадр уменьшается до размера превью до рисования рамок
+        label_widget.setPixmap(QPixmap.fromImage(PreviewRenderer.make_preview(image, bboxes, self.PREVIEW_WIDTH, color)))
+
+    def closeEvent(self, event):
+        self.renderer.stop()
+        self.detector.stop()
+        self.renderer.wait()
+        self.detector.wait()
+        super().closeEvent(event)
 
     def adjust_widget_sizes(self):
         self.original_image_label.adjustSize()
@@ -0,0 +1,286 @@
+import argparse
+import json
+import os
+import signal
+import sys
+from AugmentationEngine import AugmentationEngine
+from DatasetIndex import DatasetIndex
+from DecodedStore import DecodedStore
+from FrameResizer import FrameResizer
+from LabelCache import LabelCache
+from LabelSanitizer import LabelSanitizer
+from Modes import Modes
+from ImageAugmentor import ImageAugmentor
+from ImageEncoder import ImageEncoder
+from ShardWriter import ShardWriter
+from Utilities import Utilities
+from VariantScheduler import VariantScheduler
+
+# Консольный запуск пакетной аугментации (без дисплея и PyQt5)
+DEFAULT_PROBABILITY = 0.3
+DEFAULT_AUG_PER_IMAGE = 3
+
+def load_settings(settings_path, probability):
+    if settings_path is None:
+        return ImageAugmentor.default_settings(probability)
+
+    with open(settings_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def workers_count(value):
+    return AugmentationEngine.AUTO_WORKERS if value == "auto" else int(value)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Пакетная аугментация датасета без графического интерфейса")
+    parser.add_argument("directory", help="Директория датасета (images/ + labels/ или просто изображения)")
+    parser.add_argument("--settings", default=None,
+                        help="JSON с настройками аугментаций в формате DataAugmentationApp.augmentation_settings")
+    parser.add_argument("--probability", type=float, default=DEFAULT_PROBABILITY,
+                        help="Вероятность для настроек по умолчанию (если --settings не задан)")
+    parser.add_argument("--augmentations-per-image", type=int, default=DEFAULT_AUG_PER_IMAGE)
+    parser.add_argument("--workers", type=workers_count, default=AugmentationEngine.DEFAULT_WORKERS,
+                        help="Число воркеров или auto - подбор воркеров и потоков OpenCV по ходу запуска")
+    parser.add_argument("--backend", choices=AugmentationEngine.BACKENDS, default=AugmentationEngine.BACKEND_THREAD,
+                        help="thread - пул потоков, process - пул процессов с передачей кадров через разделяемую память")
+    parser.add_argument("--readers", type=int, default=AugmentationEngine.DEFAULT_READERS,
+                        help="Потоков чтения/декодирования")
+    parser.add_argument("--writers", type=int, default=AugmentationEngine.DEFAULT_WRITERS,
+                        help="Потоков кодирования/записи")
+    parser.add_argument("--queue-size", type=int, default=AugmentationEngine.DEFAULT_QUEUE_SIZE,
+                        help="Размер очередей между стадиями (ограничивает пиковую память)")
+    parser.add_argument("--format", choices=(ImageEncoder.FORMAT_SOURCE, *ImageEncoder.FORMATS),
+                        default=ImageEncoder.FORMAT_SOURCE, help="Формат выходных изображений")
+    parser.add_argument("--level", type=int, default=None,
+                        help="Качество JPEG/WebP (0-100) или степень сжатия PNG (0-9)")
+    parser.add_argument("--target-size", type=int, default=None,
+                        help="Уменьшить кадры до этого размера (px) сразу после чтения, до аугментации")
+    parser.add_argument("--resize-mode", choices=FrameResizer.MODES, default=FrameResizer.MODE_FIT,
+                        help="fit - длинная сторона равна --target-size, letterbox - квадрат с полями")
+    parser.add_argument("--balance-classes", action="store_true",
+                        help="Больше вариантов изображениям с редкими классами, меньше - с частыми")
+    parser.add_argument("--total-variants", type=int, default=None,
+                        help="Всего вариантов на датасет (по умолчанию число изображений × --augmentations-per-image)")
+    parser.add_argument("--budget-mpix", type=float, default=None,
+                        help="Бюджет вычислений: суммарная площадь вариантов в мегапикселях (после --target-size)")
+    parser.add_argument("--max-variants", type=int, default=VariantScheduler.DEFAULT_MAX_VARIANTS,
+                        help="Максимум вариантов одного изображения при планировании")
+    parser.add_argument("--max-errors", type=int, default=None,
+                        help="Остановить запуск, когда ошибок станет больше (по умолчанию не останавливать)")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="Остановить запуск, когда доля файлов с ошибками превысит это значение (0-1)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed запуска: вариант определяется настройками, seed, путем исходника и номером варианта")
+    parser.add_argument("--shard-index", type=int, default=0,
+                        help="Номер части датасета для этого процесса (0..--shard-count-1)")
+    parser.add_argument("--shard-count", type=int, default=1,
+                        help="На сколько частей делится датасет между процессами/машинами, запущенными на одной директории")
+    parser.add_argument("--output", choices=AugmentationEngine.OUTPUTS, default=AugmentationEngine.OUTPUT_FILES,
+                        help="files - отдельные файлы, shards - tar-шарды с индексом в augmented_shards/")
+    parser.add_argument("--shard-size-mb", type=float, default=ShardWriter.DEFAULT_SHARD_SIZE_MB,
+                        help="Максимальный размер одного шарда")
+    parser.add_argument("--index", action="store_true",
+                        help=f"Только обновить индекс датасета {DatasetIndex.FILE_NAME} и вывести сводку")
+    parser.add_argument("--prepare", action="store_true",
+                        help=f"Только декодировать датасет в {DecodedStore.DIRECTORY}/ для повторных запусков и выйти")
+    parser.add_argument("--build-label-cache", action="store_true",
+                        help=f"Только построить бинарный кэш разметки {LabelCache.FILE_NAME} и выйти")
+    parser.add_argument("--auto-label", action="store_true",
+                        help="Только разметить изображения моделью YOLO (пакетно, на CPU) и выйти")
+    parser.add_argument("--weights", default=None, help="Веса модели YOLO для --auto-label и --hard-examples")
+    parser.add_argument("--batch-size", type=int, default=16, help="Размер пакета для --auto-label")
+    parser.add_argument("--confidence", type=float, default=0.25, help="Порог уверенности для --auto-label и --hard-examples")
+    parser.add_argument("--hard-examples", action="store_true",
+                        help="Сначала прогнать модель по датасету и аугментировать только изображения, "
+                             "на которых она ошибается (больше вариантов - самым сложным)")
+    parser.add_argument("--label-output", default=None,
+                        help="Директория размеченного датасета (по умолчанию DIR/auto_labeled или сам DIR)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Не пропускать варианты, уже отмеченные в журнале manifest.jsonl")
+    parser.add_argument("--no-decoded-store", action="store_true",
+                        help="Не использовать подготовленное хранилище декодированных кадров")
+    parser.add_argument("--check-labels", action="store_true",
+                        help="Только проверить разметку и записать отчет label_report.json в директорию датасета")
+    parser.add_argument("--no-sanitize-labels", action="store_true",
+                        help="Не исправлять рамки за пределами изображения и вырожденные рамки перед запуском")
+    parser.add_argument("--batch-variants", action="store_true",
+                        help="Аугментировать варианты изображения вместе с общим проходом точечных аугментаций "
+                             "(включать, если TransformBenchmark --variants показывает ускорение на ваших настройках)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Замерять стадии и отдельные аугментации, отчет - profile_report.json в выходной директории")
+    return parser
+
+def format_profile(report):
+    lines = [f"{'этап':<36} {'кол-во':>8} {'всего, с':>10} {'ср., мс':>9} {'p50':>8} {'p90':>8} {'p99':>8} {'макс.':>9}"]
+    for name, timing in report.items():
+        lines.append(
+            f"{name:<36} {timing['count']:>8} {timing['total_s']:>10.2f} {timing['mean_ms']:>9.2f} "
+            f"{timing['p50_ms']:>8.2f} {timing['p90_ms']:>8.2f} {timing['p99_ms']:>8.2f} {timing['max_ms']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+def auto_label(args, on_progress, on_error):
+    # ultralytics подключается только для этого режима
+    from AutoLabeler import AutoLabeler
+    from YoloModel import YoloModel
+
+    labeler = AutoLabeler(
+        args.directory,
+        args.weights or YoloModel.DEFAULT_MODEL,
+        args.label_output,
+        args.batch_size,
+        args.confidence,
+        readers=args.readers,
+        progress_callback=on_progress,
+        error_callback=on_error,
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: labeler.stop())
+    labeled, skipped, time_elapsed = labeler.run()
+
+    rate = labeled / time_elapsed if time_elapsed > 0 else 0.0
+    print(f"\nРазмечено изображений: {labeled} (пропущено уже размеченных: {skipped})\n"
+          f"Времени затрачено: {time_elapsed:.2f} с ({rate:.2f} изображений/с)\n"
+          f"Датасет: {labeler.output_directory}")
+    return 0
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    settings = load_settings(args.settings, args.probability)
+
+    last_percent = [-1]
+    def on_progress(percent):
+        if percent != last_percent[0]:
+            last_percent[0] = percent
+            print(f"\rПрогресс: {percent}%", end="", file=sys.stderr, flush=True)
+
+    def on_error(message):
+        print(f"\n{message}", file=sys.stderr)
+
+    if args.auto_label:
+        return auto_label(args, on_progress, on_error)
+
+    if args.index:
+        summary = DatasetIndex.refresh(args.directory, readers=args.readers).summary()
+        print(f"Изображений: {summary['images']}, с разметкой: {summary['labeled']}, рамок: {summary['boxes']}, "
+              f"размер не определен: {summary['unreadable']}")
+        return 0
+
+    if args.check_labels:
+        mode = Utilities.determine_mode(args.directory)
+        if mode != Modes.IMAGES_WITH_LABELS:
+            parser.error("В директории нет разметки (images/ + labels/)")
+        label_cache = LabelCache.open(args.directory)
+        sanitizer = LabelSanitizer.scan(
+            args.directory,
+            DatasetIndex.refresh(args.directory, mode, args.readers).image_paths(),
+            lambda image_path: label_cache.load_labels(mode, image_path) if label_cache is not None
+            else Utilities.load_labels(mode, args.directory, image_path),
+            args.readers,
+        )
+        report_path = os.path.join(args.directory, LabelSanitizer.REPORT_NAME)
+        sanitizer.write_report(report_path)
+        totals = sanitizer.totals()
+        print(f"Файлов с исправленной разметкой: {totals['label_files_repaired']}, рамок обрезано: {totals['boxes_clipped']}, "
+              f"удалено: {totals['boxes_dropped']}, нечитаемых файлов: {totals['label_files_unreadable']}\n"
+              f"Отчет: {report_path}")
+        return 0
+
+    if args.prepare or args.build_label_cache:
+        mode = Utilities.determine_mode(args.directory)
+        image_paths = DatasetIndex.refresh(args.directory, mode, args.readers).image_paths()
+        if mode == Modes.IMAGES_WITH_LABELS:
+            label_cache = LabelCache.build(args.directory, image_paths, on_error)
+            print(f"Файлов разметки в кэше: {len(label_cache.index)}")
+        if args.prepare:
+            prepared = DecodedStore.prepare(args.directory, mode, image_paths, args.readers, on_progress, on_error)
+            print(f"\nПодготовлено изображений: {prepared}")
+        return 0
+
+    yolo_model = None
+    if args.hard_examples:
+        # ultralytics подключается только для этого режима
+        from YoloModel import YoloModel
+        yolo_model = YoloModel()
+        try:
+            yolo_model.load(args.weights or YoloModel.DEFAULT_MODEL)
+        except Exception as e:
+            parser.error(f"Не удалось загрузить модель YOLO: {e}")
+
+    try:
+        engine = AugmentationEngine(
+            args.directory,
+            settings,
+            args.augmentations_per_image,
+            args.workers,
+            progress_callback=on_progress,
+            error_callback=on_error,
+            backend=args.backend,
+            readers=args.readers,
+            writers=args.writers,
+            queue_size=args.queue_size,
+            output_format=args.format,
+            output_level=args.level,
+            output=args.output,
+            shard_size_mb=args.shard_size_mb,
+            use_decoded_store=not args.no_decoded_store,
+            resume=not args.no_resume,
+            profile=args.profile,
+            batch_variants=args.batch_variants,
+            sanitize_labels=not args.no_sanitize_labels,
+            target_size=args.target_size,
+            resize_mode=args.resize_mode,
+            balance_classes=args.balance_classes,
+            total_variants=args.total_variants,
+            budget_megapixels=args.budget_mpix,
+            max_variants=args.max_variants,
+            max_errors=args.max_errors,
+            max_error_rate=args.max_error_rate,
+            hard_examples=args.hard_examples,
+            yolo_model=yolo_model,
+            detection_confidence=args.confidence,
+            seed=args.seed,
+            shard_index=args.shard_index,
+            shard_count=args.shard_count,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Ctrl+C: оставшиеся изображения пропускаются, уже запущенные дорабатывают
+    signal.signal(signal.SIGINT, lambda signum, frame: engine.stop())
+    count, total_count, time_elapsed = engine.run()
+
+    rate = len(engine.image_paths) / time_elapsed if time_elapsed > 0 else 0.0
+    print(f"\nАугментация завершена!\nПолучено изображений: {count}/{total_count}\n"
+          f"Времени затрачено: {time_elapsed:.2f} с ({rate:.2f} исходных изображений/с)\n"
+          f"Кодирование: {engine.stats['encode_time']:.2f} с, запись: {engine.stats['write_time']:.2f} с, "
+          f"записано: {engine.stats['bytes_written'] / 1024 / 1024:.1f} МБ\n"
+          f"Пропущено готовых вариантов: {engine.stats['resumed_variants']}\n"
+          f"Неудачных попыток аугментации: {engine.stats['failed_attempts']}, "
+          f"не аугментировано вариантов: {engine.stats['failed_variants']}")
+    if engine.work_shard.count > 1:
+        print(f"Часть {engine.work_shard.index + 1} из {engine.work_shard.count}: "
+              f"{len(engine.image_paths)} из {engine.dataset_images} исходных изображений")
+    if "hard_examples" in engine.stats:
+        hard = engine.stats["hard_examples"]
+        print(f"Сложные примеры: оценено {hard['scored']} изображений (из прошлого отчета: {hard['reused']}), "
+              f"простых пропущено: {hard['easy']}, отчет: {hard['report']}")
+    if "plan" in engine.stats:
+        plan = engine.stats["plan"]
+        print(f"План: {plan['variants']} вариантов для {plan['scheduled_images']} из {plan['images']} изображений "
+              f"(не больше {plan['max_per_image']} на изображение), план: {engine.stats['plan_path']}")
+    if "label_report" in engine.stats:
+        print(f"Исправлена разметка в {engine.stats['label_files_repaired']} файлах (рамок обрезано: "
+              f"{engine.stats['boxes_clipped']}, удалено: {engine.stats['boxes_dropped']}), "
+              f"отчет: {engine.stats['label_report']}")
+    if "autotune" in engine.stats:
+        autotune = engine.stats["autotune"]
+        print(f"Автоподбор: воркеров {autotune['workers']}, потоков OpenCV/BLAS {autotune['library_threads']} "
+              f"(ядер: {autotune['cpu_count']}, проб: {len(autotune['trials'])})")
+    if "error_report" in engine.stats:
+        print(f"{engine.errors.format_summary()}\nОтчет об ошибках: {engine.stats['error_report']}")
+    if engine.profiler is not None:
+        print(f"\n{format_profile(engine.profiler.report())}\nОтчет профилирования: {engine.stats['profile_report']}")
+    return 0 if count == total_count else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
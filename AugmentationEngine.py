@@ -0,0 +1,657 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from BatchAugmentor import BatchAugmentor
+from DatasetIndex import DatasetIndex
+from DecodedStore import DecodedStore
+from ErrorCollector import ErrorCollector
+from FrameResizer import FrameResizer
+from HardExampleMiner import HardExampleMiner
+from ImageAugmentor import ImageAugmentor
+from ImageEncoder import ImageEncoder
+from LabelCache import LabelCache
+from LabelSanitizer import LabelSanitizer
+from Modes import Modes
+from PreviewThrottle import PreviewThrottle
+from RunManifest import RunManifest
+from RunProfiler import RunProfiler
+from ShardWriter import ShardWriter
+from SharedFrame import SharedFrame
+from StreamingPipeline import StreamingPipeline
+from Utilities import Utilities
+from VariantScheduler import VariantScheduler
+from WorkerAutotuner import WorkerAutotuner
+from WorkShard import WorkShard
+
+# Пакетная аугментация без зависимости от PyQt5: используется и GUI, и CLI.
+# Работа идет потоково: чтение -> аугментация -> кодирование/запись,
+# у каждой стадии своя степень параллелизма, между стадиями ограниченные очереди.
+class AugmentationEngine:
+    DEFAULT_WORKERS = 12
+    AUTO_WORKERS = 0        # workers=0 - число воркеров и потоков OpenCV подбирается по ходу запуска
+    DEFAULT_READERS = 2
+    DEFAULT_WRITERS = 4
+    DEFAULT_QUEUE_SIZE = 32
+    PROFILE_INTERVAL = 2.0      # с между живыми сводками профилирования
+    PROFILE_REPORT_NAME = "profile_report.json"
+    OUTPUT_IMAGES_DIR = "augmented_images"
+    OUTPUT_LABELS_DIR = "augmented_labels"
+    OUTPUT_SHARDS_DIR = "augmented_shards"
+    OUTPUT_FILES = "files"
+    OUTPUT_SHARDS = "shards"
+    OUTPUTS = (OUTPUT_FILES, OUTPUT_SHARDS)
+    BACKEND_THREAD = "thread"
+    BACKEND_PROCESS = "process"
+    BACKENDS = (BACKEND_THREAD, BACKEND_PROCESS)
+
+    def __init__(self, directory, settings, augmentations_per_image, workers=DEFAULT_WORKERS,
+                 image_paths=None, mode=None, progress_callback=None, preview_callback=None, error_callback=None,
+                 backend=BACKEND_THREAD, readers=DEFAULT_READERS, writers=DEFAULT_WRITERS, queue_size=DEFAULT_QUEUE_SIZE,
+                 preview_rate=None, preview_size=None, output_format=ImageEncoder.FORMAT_SOURCE, output_level=None,
+                 output=OUTPUT_FILES, shard_size_mb=ShardWriter.DEFAULT_SHARD_SIZE_MB, use_decoded_store=True,
+                 resume=True, profile=False, profile_callback=None, batch_variants=False, sanitize_labels=True,
+                 target_size=None, resize_mode=FrameResizer.MODE_FIT, balance_classes=False, total_variants=None,
+                 budget_megapixels=None, max_variants=VariantScheduler.DEFAULT_MAX_VARIANTS, max_errors=None,
+                 max_error_rate=None, hard_examples=False, yolo_model=None,
+                 detection_confidence=HardExampleMiner.DEFAULT_CONFIDENCE, seed=0, shard_index=0, shard_count=1):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Неизвестный backend: {backend}")
+        if output not in self.OUTPUTS:
+            raise ValueError(f"Неизвестный тип вывода: {output}")
+
+        self.directory = directory
+        self.mode = mode if mode is not None else Utilities.determine_mode(directory)
+        if hard_examples and self.mode != Modes.IMAGES_WITH_LABELS:
+            raise ValueError("Для отбора сложных примеров нужна разметка (images/ + labels/)")
+        # Без явного списка изображения берутся из индекса датасета (обновляется по изменившимся файлам)
+        image_paths = image_paths if image_paths is not None else DatasetIndex.refresh(directory, self.mode, readers).image_paths()
+        # Несколько процессов/машин на одной директории: каждый обрабатывает свою часть исходников
+        self.work_shard = WorkShard(shard_index, shard_count)
+        self.dataset_images = len(image_paths)
+        self.image_paths = self.work_shard.select(directory, image_paths)
+        self.images_root = Utilities.images_root(directory, self.mode)
+        self.settings = settings
+        # Каждый вариант аугментируется со своим seed (variant_seed), поэтому воспроизводим
+        self.seed = seed
+        self.seed_key = RunManifest.config_hash(settings, self.mode.name, seed)
+        # Профилирование стадий и отдельных аугментаций (выключено по умолчанию)
+        self.profiler = RunProfiler() if profile else None
+        # У каждого потока аугментации свой пайплайн: seed задает состояние генераторов пайплайна
+        self._local = threading.local()
+        self.thread_pipeline()
+        self.augmentations_per_image = augmentations_per_image
+        # План числа вариантов по изображениям (VariantScheduler) вместо одинакового augmentations_per_image:
+        # балансировка по редкости классов и/или бюджет всего вариантов или мегапикселей
+        self.balance_classes = balance_classes and self.mode == Modes.IMAGES_WITH_LABELS
+        self.total_variants = total_variants
+        self.budget_megapixels = budget_megapixels
+        self.max_variants = max_variants
+        # Варианты только для изображений, на которых модель ошибается (HardExampleMiner)
+        self.hard_examples = hard_examples
+        self.yolo_model = yolo_model
+        self.detection_confidence = detection_confidence
+        self.plan = None
+        self._variant_counts = {}
+        self.workers = workers
+        # Варианты изображения проходят пайплайн вместе (BatchAugmentor)
+        self.batch_variants = batch_variants
+        self.autotuner = None
+        self.backend = backend
+        self.readers = readers
+        self.writers = writers
+        self.queue_size = queue_size
+        self.output_images_dir = os.path.join(directory, self.OUTPUT_IMAGES_DIR)
+        self.output_labels_dir = os.path.join(directory, self.OUTPUT_LABELS_DIR)
+        self.output_shards_dir = os.path.join(directory, self.OUTPUT_SHARDS_DIR)
+        self.encoder = ImageEncoder(output_format, output_level)
+        # Кадры уменьшаются до целевого размера сразу после декодирования
+        self.resizer = FrameResizer(target_size, resize_mode) if target_size else None
+        self.output = output
+        self.shard_size_mb = shard_size_mb
+        self._shard_writer = None
+        # Журнал готовых вариантов: повторный запуск пропускает уже сделанную работу
+        self.resume = resume
+        self._manifest = None
+        # Подготовленное хранилище декодированных кадров (DecodedStore.prepare), если есть
+        self.decoded_store = DecodedStore.open(directory) if use_decoded_store else None
+        self.label_cache = LabelCache.open(directory) if self.mode == Modes.IMAGES_WITH_LABELS else None
+        # Перед запуском рамки всех файлов проверяются и исправляются (LabelSanitizer)
+        self.sanitize_labels = sanitize_labels and self.mode == Modes.IMAGES_WITH_LABELS
+        self.sanitizer = None
+
+        # Обратные вызовы: progress(int %), preview(orig, orig_bboxes, aug, aug_bboxes), error(str),
+        # profile(сводка RunProfiler.report())
+        self.progress_callback = progress_callback
+        self.preview_callback = preview_callback
+        self.error_callback = error_callback
+        self.profile_callback = profile_callback
+        # preview_rate=None - превью каждого варианта в полном разрешении
+        self.preview_throttle = PreviewThrottle(preview_rate, preview_size)
+        # Ошибки стадий собираются для итогового отчета; при превышении порогов запуск останавливается
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.errors = ErrorCollector(max_errors, max_error_rate)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._is_running = True
+        self._executor = None
+        self._executor_workers = None
+        self._executor_lock = threading.Lock()
+        self._retired_executors = []
+        self._streaming = None
+
+    def thread_pipeline(self):
+        pipeline = getattr(self._local, "pipeline", None)
+        if pipeline is None:
+            pipeline = self._local.pipeline = ImageAugmentor.update_pipeline(self.settings, self.mode)
+            if self.profiler is not None:
+                self.profiler.wrap_pipeline(pipeline)
+        return pipeline
+
+    def variant_seed(self, image_path, index):
+        # Зависит только от настроек, seed запуска, относительного пути исходника и номера варианта:
+        # вариант получается тем же в любом процессе, на любой машине и при любом разбиении на части
+        key = f"{self.seed_key}:{WorkShard.key(self.manifest_source(image_path))}:{index}"
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    @staticmethod
+    def augment_variants(pipeline, image, bboxes, labels, augmentations_per_image, profiler=None, batched=False,
+                         failures=None, seeds=None):
+        if batched:
+            start = time.perf_counter()
+            variants = BatchAugmentor.augment_variants(
+                pipeline, image, bboxes, labels, augmentations_per_image, profiler=profiler, failures=failures, seeds=seeds
+            )
+            if profiler is not None:
+                profiler.record("augment.batch", time.perf_counter() - start)
+            yield from variants
+            return
+
+        for i in range(augmentations_per_image):
+            if seeds is not None:
+                pipeline.set_random_seed(seeds[i])
+            start = time.perf_counter()
+            result = Utilities.attempt_augmentation(pipeline, image, bboxes, labels, profiler=profiler, failures=failures)
+            if profiler is not None:
+                profiler.record("augment", time.perf_counter() - start)
+            yield result
+
+    def read_stage(self, image_path):
+        if not self._is_running:
+            return []
+        self.errors.count_item()
+        signature = Utilities.sources_signature(self.mode, self.directory, image_path)
+        count = self.variant_count(image_path)
+        variants = list(range(count))
+        if self._manifest is not None:
+            variants = self._manifest.pending_variants(self.manifest_source(image_path), signature, count)
+        resumed = count - len(variants)
+        if resumed:
+            self.add_stats(resumed_variants=resumed)
+        if not variants:
+            # Все варианты уже готовы - изображение даже не декодируется
+            return [{"image_path": image_path, "resumed": resumed}]
+
+        start = time.perf_counter()
+        stored = self.decoded_store.get(self.mode, image_path) if self.decoded_store is not None else None
+        if stored is not None:
+            image, bboxes, labels = stored
+            self.record("decode.store", time.perf_counter() - start)
+        else:
+            image = Utilities.read_image(image_path)
+            decoded = time.perf_counter()
+            bboxes, labels = self.load_labels(image_path)
+            self.record("decode", decoded - start)
+            self.record("labels", time.perf_counter() - decoded)
+        if self.sanitizer is not None:
+            bboxes, labels = self.sanitizer.load_labels(image_path, bboxes, labels)
+        if self.resizer is not None:
+            start = time.perf_counter()
+            image, bboxes = self.resizer.resize(image, bboxes)
+            # Погрешность пересчета рамок в letterbox не должна выводить их за границы
+            if self.sanitizer is not None and self.resizer.mode == FrameResizer.MODE_LETTERBOX and Utilities.has_boxes(bboxes):
+                bboxes, labels, _, _ = LabelSanitizer.sanitize(bboxes, labels)
+            self.record("resize", time.perf_counter() - start)
+        return [{
+            "image_path": image_path,
+            "image": image,
+            "bboxes": bboxes,
+            "labels": labels,
+            "signature": signature,
+            "variants": variants,
+            "resumed": resumed,
+        }]
+
+    def variant_count(self, image_path):
+        return self._variant_counts[image_path] if self.plan is not None else self.augmentations_per_image
+
+    def uses_plan(self):
+        return (self.balance_classes or self.hard_examples or self.total_variants is not None
+                or self.budget_megapixels is not None)
+
+    def plan_variants(self, output_dir):
+        # Без бюджета планируется столько же вариантов, сколько дало бы одинаковое число на изображение
+        # (в режиме сложных примеров - на каждое сложное изображение)
+        costs = budget = hardness = None
+        planned_images = len(self.image_paths)
+        if self.hard_examples:
+            hardness = self.mine_hard_examples(output_dir)
+            planned_images = sum(1 for value in hardness if value > 0)
+        if self.budget_megapixels is not None:
+            index = DatasetIndex.open(self.directory, self.mode)
+            costs = [self.variant_megapixels(index, image_path) for image_path in self.image_paths]
+            budget = self.budget_megapixels
+        total_variants = self.total_variants if self.total_variants is not None else planned_images * self.augmentations_per_image
+        if self.work_shard.count > 1:
+            # Заданный бюджет относится ко всему датасету: части получают долю по числу своих изображений
+            share = len(self.image_paths) / max(1, self.dataset_images)
+            if self.total_variants is not None:
+                total_variants = round(total_variants * share)
+            if budget is not None:
+                budget *= share
+        self.plan = VariantScheduler.plan(
+            self.image_paths,
+            self.load_classes if self.balance_classes else None,
+            total_variants,
+            budget,
+            costs,
+            max_variants=self.max_variants,
+            readers=self.readers,
+            hardness=hardness,
+        )
+        self._variant_counts = dict(zip(self.image_paths, self.plan.counts.tolist()))
+        self.stats["plan"] = self.plan.summary()
+        self.stats["plan_path"] = os.path.join(output_dir, self.work_shard.file_name(VariantScheduler.PLAN_NAME))
+        self.plan.write(self.stats["plan_path"], self.manifest_source)
+
+    def mine_hard_examples(self, output_dir):
+        # Модель прогоняется по исходникам до аугментации; прогресс этого этапа показывается отдельно
+        from YoloModel import YoloModel
+
+        if self.yolo_model is None:
+            self.yolo_model = YoloModel()
+        report_path = os.path.join(output_dir, self.work_shard.file_name(HardExampleMiner.REPORT_NAME))
+        miner = HardExampleMiner.mine(
+            self.yolo_model, self.directory, self.mode, self.image_paths, self.load_sanitized_labels, report_path,
+            confidence=self.detection_confidence, readers=self.readers, progress_callback=self.progress_callback,
+            error_callback=self.report_error, is_running=lambda: self._is_running,
+        )
+        self.stats["hard_examples"] = {**miner.summary(), "report": report_path}
+        return [miner.hardness(self.manifest_source(image_path)) for image_path in self.image_paths]
+
+    def load_sanitized_labels(self, image_path):
+        bboxes, labels = self.load_labels(image_path)
+        if self.sanitizer is not None:
+            bboxes, labels = self.sanitizer.load_labels(image_path, bboxes, labels)
+        return bboxes, labels
+
+    def load_classes(self, image_path):
+        return self.load_sanitized_labels(image_path)[1]
+
+    def variant_megapixels(self, index, image_path):
+        # Время аугментации пропорционально площади кадра после изменения размера
+        size = index.image_size(image_path) if index is not None else None
+        if size is None:
+            size = DatasetIndex.read_image_size(image_path) or (1, 1)
+        width, height = size
+        if self.resizer is not None:
+            if self.resizer.mode == FrameResizer.MODE_LETTERBOX:
+                return self.resizer.target_size ** 2 / 1e6
+            scale = min(1.0, self.resizer.target_size / max(width, height))
+            width, height = width * scale, height * scale
+        return width * height / 1e6
+
+    def manifest_source(self, image_path):
+        return os.path.relpath(image_path, self.directory)
+
+    def load_labels(self, image_path):
+        if self.label_cache is not None:
+            return self.label_cache.load_labels(self.mode, image_path)
+        return Utilities.load_labels(self.mode, self.directory, image_path)
+
+    def augment_stage(self, task):
+        if not self._is_running:
+            return []
+
+        # Уже готовые варианты проходят дальше только для учета прогресса
+        results = [{"image_path": task["image_path"], "resumed": task["resumed"]}] if task["resumed"] else []
+        if "variants" not in task:
+            return results
+
+        # Описания неудачных попыток аугментации (включая повторные)
+        failures = []
+        seeds = [self.variant_seed(task["image_path"], i) for i in task["variants"]]
+        with self.augment_slot():
+            if self.backend == self.BACKEND_PROCESS:
+                variants = self.augment_in_process(task, seeds, failures)
+            else:
+                variants = self.augment_variants(
+                    self.thread_pipeline(), task["image"], task["bboxes"], task["labels"], len(task["variants"]),
+                    self.profiler, self.batch_variants, failures, seeds,
+                )
+
+            for i, (ok, augmented_image, augmented_bboxes, augmented_labels) in zip(task["variants"], variants):
+                results.append({
+                    "image_path": task["image_path"],
+                    "signature": task["signature"],
+                    "index": i,
+                    "ok": ok,
+                    "image": augmented_image,
+                    "bboxes": augmented_bboxes,
+                    "labels": augmented_labels,
+                })
+
+                if ok and self.preview_callback is not None:
+                    self.send_preview(task["image"], task["bboxes"], augmented_image, augmented_bboxes)
+        if failures:
+            self.add_stats(failed_attempts=len(failures))
+        return results
+
+    def augment_slot(self):
+        # В режиме автоподбора одновременно работает не больше воркеров, чем в текущей пробе
+        return self.autotuner.slot() if self.autotuner is not None else nullcontext()
+
+    def process_executor(self):
+        # Пул процессов следует числу воркеров текущей пробы автоподбора: после выбора лучшей
+        # конфигурации лишние процессы со своими пайплайнами не остаются до конца запуска.
+        # Прежний пул дорабатывает отправленные задачи и закрывается в конце запуска
+        if self.autotuner is None:
+            return self._executor
+        with self._executor_lock:
+            if self._executor_workers != self.autotuner.workers:
+                self._executor.shutdown(wait=False)
+                self._retired_executors.append(self._executor)
+                self._executor_workers = self.autotuner.workers
+                self._executor = self.create_executor(self._executor_workers)
+            return self._executor
+
+    def send_preview(self, image, bboxes, augmented_image, augmented_bboxes):
+        if not self.preview_throttle.try_acquire():
+            return
+        self.preview_callback(
+            self.preview_throttle.thumbnail(image),
+            bboxes,
+            self.preview_throttle.thumbnail(augmented_image),
+            augmented_bboxes,
+        )
+
+    def augment_in_process(self, task, seeds, failures):
+        # Кадры передаются в процесс и обратно через разделяемую память
+        frame = SharedFrame.put(task["image"])
+        future = self.process_executor().submit(
+            _augment_in_worker, frame, task["bboxes"], task["labels"], len(task["variants"]),
+            self.autotuner.library_threads if self.autotuner is not None else None, seeds,
+        )
+        try:
+            variants, snapshot, worker_failures = future.result()
+        except BaseException:
+            SharedFrame.release(frame)
+            raise
+        # Гистограммы воркера переносятся в профилировщик основного процесса
+        if self.profiler is not None and snapshot:
+            self.profiler.merge(snapshot)
+        failures.extend(worker_failures)
+
+        return [
+            (ok, SharedFrame.take(augmented_frame) if ok else task["image"], augmented_bboxes, augmented_labels)
+            for ok, augmented_frame, augmented_bboxes, augmented_labels in variants
+        ]
+
+    def write_stage(self, variant):
+        if "resumed" in variant:
+            return [variant["image_path"]] * variant["resumed"]
+        if self.autotuner is not None:
+            self.autotuner.record()
+        if not variant["ok"]:
+            # Все попытки неудачны: вариант не сохраняется, но учитывается
+            self.add_stats(failed_variants=1)
+            return [variant["image_path"]]
+
+        image_name, label_name = Utilities.get_augm_names(
+            variant["index"], variant["image_path"], self.encoder.extension(variant["image_path"]), self.images_root
+        )
+
+        start = time.perf_counter()
+        data = self.encoder.encode(variant["image"], os.path.splitext(image_name)[1])
+        label_data = None
+        if self.mode == Modes.IMAGES_WITH_LABELS and Utilities.has_boxes(variant["bboxes"]) and Utilities.has_boxes(variant["labels"]):
+            label_data = Utilities.format_yolo_labels(variant["bboxes"], variant["labels"]).encode('utf-8')
+        encoded = time.perf_counter()
+
+        if self._shard_writer is not None:
+            self._shard_writer.add(image_name, data, label_name, label_data)
+        else:
+            Utilities.write_bytes(os.path.join(self.output_images_dir, image_name), data)
+            if label_data is not None:
+                Utilities.write_bytes(os.path.join(self.output_labels_dir, label_name), label_data)
+
+        written = time.perf_counter()
+        self.add_stats(encode_time=encoded - start, write_time=written - encoded, bytes_written=data.nbytes + (len(label_data) if label_data is not None else 0))
+        self.record("encode", encoded - start)
+        self.record("write", written - encoded)
+
+        # Вариант попадает в журнал только после записи результата
+        if self._manifest is not None:
+            self._manifest.add(self.manifest_source(variant["image_path"]), variant["signature"], variant["index"])
+        return [variant["image_path"]]
+
+    def add_stats(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+
+    def record(self, name, seconds):
+        if self.profiler is not None:
+            self.profiler.record(name, seconds)
+
+    def run(self):
+        start_time = time.time()
+
+        output_dir = self.output_shards_dir if self.output == self.OUTPUT_SHARDS else self.output_images_dir
+        iteration = 0
+        total_iterations = 0
+        self.errors = ErrorCollector(self.max_errors, self.max_error_rate)
+        self.stats = {
+            "encode_time": 0.0, "write_time": 0.0, "bytes_written": 0, "resumed_variants": 0,
+            "failed_attempts": 0, "failed_variants": 0,
+        }
+        try:
+            # Создаем директории (или шарды) для сохранения результатов
+            if self.output == self.OUTPUT_SHARDS:
+                self._shard_writer = ShardWriter(self.output_shards_dir, self.shard_size_mb, self.work_shard)
+            else:
+                os.makedirs(self.output_images_dir, exist_ok=True)
+                if self.mode == Modes.IMAGES_WITH_LABELS:
+                    os.makedirs(self.output_labels_dir, exist_ok=True)
+            if self.resume:
+                self._manifest = RunManifest(output_dir, self.config_hash(), self.work_shard.file_name(RunManifest.FILE_NAME))
+
+            image_paths = self.prepare_run(output_dir)
+            # Остановка во время проверки разметки или отбора сложных примеров - конвейер не запускается
+            if image_paths is not None and self._is_running:
+                total_iterations = self.plan.total() if self.plan is not None else len(image_paths) * self.augmentations_per_image
+                workers = self.workers
+                if workers == self.AUTO_WORKERS:
+                    self.autotuner = WorkerAutotuner(total_iterations)
+                    workers = self.autotuner.max_workers
+
+                self._streaming = StreamingPipeline(
+                    [
+                        ("read", self.read_stage, self.readers),
+                        ("augment", self.augment_stage, workers),
+                        ("write", self.write_stage, self.writers),
+                    ],
+                    self.queue_size,
+                    error_callback=self.on_stage_error,
+                )
+                if not self._is_running:
+                    self._streaming.stop()
+
+                # Потоков стадии аугментации max_workers (лишние ждут слота), а пул процессов - по текущей пробе
+                self._executor_workers = self.autotuner.workers if self.autotuner is not None else workers
+                self._executor = self.create_executor(self._executor_workers)
+                last_profile = time.monotonic()
+                for _ in self._streaming.run(image_paths):
+                    iteration += 1
+                    self.report_progress(iteration, total_iterations)
+                    if self.profile_callback is not None and time.monotonic() - last_profile >= self.PROFILE_INTERVAL:
+                        last_profile = time.monotonic()
+                        self.profile_callback(self.profiler.report())
+        finally:
+            for executor in self._retired_executors + [self._executor]:
+                if executor is not None:
+                    executor.shutdown()
+            self._retired_executors = []
+            self._executor = None
+            if self._shard_writer is not None:
+                self._shard_writer.close()
+                self._shard_writer = None
+            if self._manifest is not None:
+                self._manifest.close()
+                self._manifest = None
+            if self.autotuner is not None:
+                self.autotuner.restore()
+
+        time_elapsed = time.time() - start_time
+        self.stats["preview_sent"] = self.preview_throttle.sent
+        self.stats["preview_skipped"] = self.preview_throttle.skipped
+        if self.autotuner is not None:
+            self.stats["autotune"] = self.autotuner.report()
+        summary = self.errors.summary()
+        self.stats["errors"] = summary["errors"]
+        if summary["aborted"]:
+            self.stats["aborted"] = summary["aborted"]
+        if summary["errors"]:
+            self.stats["error_report"] = os.path.join(output_dir, self.work_shard.file_name(ErrorCollector.REPORT_NAME))
+            self.errors.write_report(self.stats["error_report"])
+        if self.profiler is not None:
+            self.stats["profile_report"] = self.write_profile_report(output_dir, iteration, total_iterations, time_elapsed)
+        return iteration, total_iterations, time_elapsed
+
+    def prepare_run(self, output_dir):
+        # Проверка разметки и план (с отбором сложных примеров). Ошибка подготовки прерывает запуск,
+        # но, как и ошибки стадий, попадает в сбор ошибок и отчет; возвращается None
+        try:
+            if self.sanitize_labels:
+                self.check_labels(output_dir)
+            if not self.uses_plan():
+                return self.image_paths
+            self.plan_variants(output_dir)
+            return [image_path for image_path in self.image_paths if self._variant_counts[image_path]]
+        except Exception as e:
+            self.errors.add(self.directory, "prepare", e)
+            self.errors.abort("ошибка подготовки запуска")
+            self.report_error(f"Ошибка подготовки запуска: {e}")
+            return None
+
+    def write_profile_report(self, output_dir, iteration, total_iterations, time_elapsed):
+        path = os.path.join(output_dir, self.work_shard.file_name(self.PROFILE_REPORT_NAME))
+        self.profiler.write_report(path, {
+            "config": {
+                "backend": self.backend,
+                "workers": self.workers,
+                "readers": self.readers,
+                "writers": self.writers,
+                "queue_size": self.queue_size,
+                "augmentations_per_image": self.augmentations_per_image,
+                "balance_classes": self.balance_classes,
+                "total_variants": self.total_variants,
+                "budget_megapixels": self.budget_megapixels,
+                "hard_examples": self.hard_examples,
+                "seed": self.seed,
+                "shard": [self.work_shard.index, self.work_shard.count],
+                "output": self.output,
+                "output_format": self.encoder.output_format,
+            },
+            "iterations": iteration,
+            "total_iterations": total_iterations,
+            "elapsed_s": time_elapsed,
+            "stats": dict(self.stats),
+        })
+        if self.profile_callback is not None:
+            self.profile_callback(self.profiler.report())
+        return path
+
+    def check_labels(self, output_dir):
+        # Ошибки чтения отдельных файлов попадут в отчет, а при аугментации будут сообщены как обычно
+        self.sanitizer = LabelSanitizer.scan(self.directory, self.image_paths, self.load_labels, self.readers)
+        self.stats.update(self.sanitizer.totals())
+        if self.sanitizer.report or self.sanitizer.errors:
+            self.stats["label_report"] = os.path.join(output_dir, self.work_shard.file_name(LabelSanitizer.REPORT_NAME))
+            self.sanitizer.write_report(self.stats["label_report"])
+
+    def config_hash(self):
+        # Все, что влияет на содержимое и имена выходных файлов
+        parts = [self.settings, self.mode.name, self.encoder.output_format, self.encoder.params, self.output, self.seed]
+        if self.resizer is not None:
+            parts.append([self.resizer.target_size, self.resizer.mode])
+        return RunManifest.config_hash(*parts)
+
+    def create_executor(self, workers):
+        if self.backend != self.BACKEND_PROCESS:
+            return None
+
+        SharedFrame.start_tracker()
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_process_worker,
+            initargs=(self.settings, self.mode, self.profiler is not None, self.batch_variants),
+        )
+
+    def on_stage_error(self, stage, item, exception):
+        image_path = item if isinstance(item, str) else item["image_path"]
+        if self.errors.add(self.manifest_source(image_path), stage, exception):
+            self.report_error(f"Запуск остановлен: {self.errors.abort_reason}")
+            self.stop()
+        self.report_error(f"Error processing {image_path} ({stage}): {exception}")
+
+    def stop(self):
+        self._is_running = False
+        if self._streaming is not None:
+            self._streaming.stop()
+
+    def report_progress(self, iteration, total_iterations):
+        if self.progress_callback is not None and total_iterations:
+            self.progress_callback(int((iteration / total_iterations) * 100))
+
+    def report_error(self, message):
+        if self.error_callback is not None:
+            self.error_callback(message)
+
+# Состояние процесса-воркера: пайплайн собирается один раз при старте процесса
+_worker_pipeline = None
+_worker_profiler = None
+_worker_library_threads = None
+_worker_batched = False
+
+def _init_process_worker(settings, mode, profile=False, batched=False):
+    global _worker_pipeline, _worker_profiler, _worker_batched
+    _worker_batched = batched
+    _worker_pipeline = ImageAugmentor.update_pipeline(settings, mode)
+    if profile:
+        _worker_profiler = RunProfiler()
+        _worker_profiler.wrap_pipeline(_worker_pipeline)
+
+def _augment_in_worker(frame, bboxes, labels, augmentations_per_image, library_threads=None, seeds=None):
+    global _worker_library_threads
+    if library_threads is not None and library_threads != _worker_library_threads:
+        WorkerAutotuner.set_library_threads(library_threads)
+        _worker_library_threads = library_threads
+    image = SharedFrame.take(frame)
+    variants = []
+    failures = []
+    try:
+        for ok, augmented_image, augmented_bboxes, augmented_labels in AugmentationEngine.augment_variants(
+            _worker_pipeline, image, bboxes, labels, augmentations_per_image, _worker_profiler, _worker_batched, failures,
+            seeds,
+        ):
+            variants.append((ok, SharedFrame.put(augmented_image) if ok else None, augmented_bboxes, augmented_labels))
+    except BaseException:
+        for variant in variants:
+            if variant[1] is not None:
+                SharedFrame.release(variant[1])
+        raise
+    return variants, _worker_profiler.take_snapshot() if _worker_profiler is not None else None, failures
@@ -1,89 +1,61 @@
+import time
 from PyQt5.QtCore import QThread, pyqtSignal
 import numpy
-import time
-from Utilities import Utilities
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from AugmentationEngine import AugmentationEngine
+from FrameResizer import FrameResizer
 
 class AugmentationThread(QThread):
     progress = pyqtSignal(int)          # Сигнал для обновления прогресс-бара
-    error = pyqtSignal(str)             # Сигнал для отправки ошибок
+    error = pyqtSignal(str)             # Сигнал для отправки ошибок (все ошибки запуска - в engine.errors)
     finished = pyqtSignal(int, int, float)     # Сигнал завершения
     progress_preview = pyqtSignal(numpy.ndarray, object, numpy.ndarray, object)     # Сигнал для превью
+    profile_summary = pyqtSignal(object)     # Сводка профилирования (RunProfiler.report())
     ENABLE_PREVIEW = True
+    PREVIEW_MAX_RATE = 5        # Кадров превью в секунду, остальные пропускаются
+    PREVIEW_SIZE = 400          # Превью уменьшается в воркере до этого размера
 
-    def __init__(self, directory, image_paths, labels_dir, output_images_dir, output_labels_dir, pipeline, mode, augmentations_per_image, workers, parent=None):
+    def __init__(self, directory, image_paths, settings, mode, augmentations_per_image, workers,
+                 backend=AugmentationEngine.BACKEND_THREAD, profile=False, target_size=None,
+                 resize_mode=FrameResizer.MODE_FIT, balance_classes=False, total_variants=None, max_errors=None,
+                 max_error_rate=None, hard_examples=False, yolo_model=None, parent=None):
         super().__init__(parent)
-        self.directory = directory
-        self.image_paths = image_paths
-        self.labels_dir = labels_dir
-        self.output_images_dir = output_images_dir
-        self.output_labels_dir = output_labels_dir
-        self.pipeline = pipeline
-        self.mode = mode
-        self.augmentations_per_image = augmentations_per_image
-        self._is_running = True
-        self.workers = workers
-
-    def process_image(self, image_path):
-        if not self._is_running:
-            return False
-
-        try:
-            image = Utilities.open_image(image_path)
-            bboxes, labels = Utilities.process_labels(self.mode, self.directory, image_path)
-
-            for i in range(self.augmentations_per_image):
-                ok, augmented_image, augmented_bboxes, augmented_labels = Utilities.attempt_augmentation(
-                    self.pipeline, 
-                    image, 
-                    bboxes, 
-                    labels,
-                )
-
-                if ok:
-                    Utilities.save_augm(
-                        self.mode, 
-                        i, 
-                        image_path, 
-                        self.output_images_dir, 
-                        self.output_labels_dir, 
-                        augmented_image, 
-                        augmented_bboxes, 
-                        augmented_labels,
-                    )
-
-                    if self.ENABLE_PREVIEW:
-                        self.progress_preview.emit(image, bboxes, augmented_image, augmented_bboxes)
-
-            return True
-        except Exception as e:
-            self.error.emit(f"Error processing {image_path}: {e}")
-            return False
+        self.engine = AugmentationEngine(
+            directory,
+            settings,
+            augmentations_per_image,
+            workers,
+            image_paths=image_paths,
+            mode=mode,
+            progress_callback=self.progress.emit,
+            preview_callback=self.progress_preview.emit if self.ENABLE_PREVIEW else None,
+            error_callback=self.error.emit,
+            backend=backend,
+            preview_rate=self.PREVIEW_MAX_RATE,
+            preview_size=self.PREVIEW_SIZE,
+            profile=profile,
+            profile_callback=self.profile_summary.emit if profile else None,
+            target_size=target_size,
+            resize_mode=resize_mode,
+            balance_classes=balance_classes,
+            total_variants=total_variants,
+            max_errors=max_errors,
+            max_error_rate=max_error_rate,
+            hard_examples=hard_examples,
+            yolo_model=yolo_model,
+        )
 
     def run(self):
+        # План вариантов (при балансировке или бюджете) строится движком в этом потоке до начала аугментации
         start_time = time.time()
-
-        total_images = len(self.image_paths)
-        total_iterations = total_images * self.augmentations_per_image
-        iteration = 0
-
-        with ThreadPoolExecutor(max_workers=self.workers) as executor:
-            future_to_image = {executor.submit(self.process_image, image_path): image_path for image_path in self.image_paths}
-
-            for future in as_completed(future_to_image):
-                try:
-                    success = future.result()
-                    if success:
-                        iteration += self.augmentations_per_image
-                        self.progress.emit(int((iteration / total_iterations) * 100))
-                except Exception as e:
-                    image_path = future_to_image[future]
-                    self.error.emit(f"Error processing {image_path}: {e}")
-
-        end_time = time.time()  
-        time_elapsed = end_time - start_time
-
+        try:
+            iteration, total_iterations, time_elapsed = self.engine.run()
+        except Exception as e:
+            # Интерфейс разблокируется в любом случае; ошибка попадает в итоговую сводку
+            self.engine.errors.add(self.engine.directory, "run", e)
+            self.engine.errors.abort("непредвиденная ошибка запуска")
+            self.error.emit(f"Ошибка запуска: {e}")
+            iteration, total_iterations, time_elapsed = 0, 0, time.time() - start_time
         self.finished.emit(iteration, total_iterations, time_elapsed)
 
     def stop(self):
-        self._is_running = False
\ No newline at end of file
+        self.engine.stop()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from Modes import Modes
+from Utilities import Utilities
+from YoloModel import YoloModel
+
+# Пакетная разметка датасета моделью YOLO: директория ONLY_IMAGES превращается
+# в датасет IMAGES_WITH_LABELS (images/ + labels/). Уже размеченные изображения
+# пропускаются, поэтому прерванный запуск можно продолжить.
+class AutoLabeler:
+    DEFAULT_BATCH_SIZE = 16
+    DEFAULT_CONFIDENCE = 0.25
+    DEFAULT_READERS = 4
+    OUTPUT_DIR = "auto_labeled"
+
+    def __init__(self, directory, weights_path=YoloModel.DEFAULT_MODEL, output_directory=None,
+                 batch_size=DEFAULT_BATCH_SIZE, confidence=DEFAULT_CONFIDENCE, device="cpu", readers=DEFAULT_READERS,
+                 progress_callback=None, error_callback=None):
+        self.directory = directory
+        self.mode = Utilities.determine_mode(directory)
+        self.image_paths = Utilities.list_images(directory, self.mode)
+        # Для уже размеченного датасета недостающие метки дописываются в его labels/
+        if output_directory is None:
+            output_directory = directory if self.mode == Modes.IMAGES_WITH_LABELS else os.path.join(directory, self.OUTPUT_DIR)
+        self.output_directory = output_directory
+        self.output_images_dir = os.path.join(output_directory, "images")
+        self.output_labels_dir = os.path.join(output_directory, "labels")
+        self.weights_path = weights_path
+        self.batch_size = batch_size
+        self.confidence = confidence
+        self.device = device
+        self.readers = readers
+        self.progress_callback = progress_callback
+        self.error_callback = error_callback
+        self.yolo_model = YoloModel()
+        self._is_running = True
+
+    def run(self):
+        start_time = time.time()
+        os.makedirs(self.output_images_dir, exist_ok=True)
+        os.makedirs(self.output_labels_dir, exist_ok=True)
+        self.yolo_model.load(self.weights_path)
+
+        pending = [path for path in self.image_paths if not os.path.exists(self.label_path(path))]
+        skipped = len(self.image_paths) - len(pending)
+        labeled = 0
+
+        with ThreadPoolExecutor(max_workers=self.readers) as executor:
+            batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            # Следующий пакет декодируется, пока модель обрабатывает текущий
+            next_images = [executor.submit(self.read_image, path) for path in batches[0]] if batches else []
+            for number, batch in enumerate(batches):
+                if not self._is_running:
+                    break
+
+                futures = next_images
+                if number + 1 < len(batches):
+                    next_images = [executor.submit(self.read_image, path) for path in batches[number + 1]]
+
+                paths, images = [], []
+                for image_path, future in zip(batch, futures):
+                    try:
+                        images.append(future.result())
+                        paths.append(image_path)
+                    except Exception as e:
+                        self.report_error(f"Error reading {image_path}: {e}")
+
+                if images:
+                    try:
+                        detections = self.yolo_model.detect_batch(images, self.confidence, self.device)
+                    except Exception as e:
+                        self.report_error(f"Ошибка обнаружения: {e}")
+                        continue
+
+                    for image_path, (bboxes, classes) in zip(paths, detections):
+                        self.write_result(image_path, bboxes, classes)
+                    labeled += len(paths)
+
+                if self.progress_callback is not None:
+                    self.progress_callback(int(min(len(pending), (number + 1) * self.batch_size) / len(pending) * 100))
+
+        time_elapsed = time.time() - start_time
+        return labeled, skipped, time_elapsed
+
+    def stop(self):
+        self._is_running = False
+
+    def read_image(self, image_path):
+        # Ultralytics ожидает numpy-изображения в BGR
+        return Utilities.read_image_bgr(image_path)
+
+    def relative_path(self, image_path):
+        # Изображения во вложенных папках сохраняют ту же структуру в images/ и labels/ результата
+        return os.path.relpath(image_path, Utilities.images_root(self.directory, self.mode))
+
+    def label_path(self, image_path):
+        return os.path.join(self.output_labels_dir, os.path.splitext(self.relative_path(image_path))[0] + ".txt")
+
+    def write_result(self, image_path, bboxes, classes):
+        output_image_path = os.path.join(self.output_images_dir, self.relative_path(image_path))
+        if not os.path.exists(output_image_path):
+            os.makedirs(os.path.dirname(output_image_path), exist_ok=True)
+            try:
+                os.link(image_path, output_image_path)
+            except OSError:
+                shutil.copy2(image_path, output_image_path)
+
+        # Файл меток появляется атомарно и служит отметкой о завершении для продолжения
+        label_path = self.label_path(image_path)
+        os.makedirs(os.path.dirname(label_path), exist_ok=True)
+        temp_path = label_path + ".tmp"
+        Utilities.save_yolo_labels(temp_path, bboxes, classes)
+        os.replace(temp_path, label_path)
+
+    def report_error(self, message):
+        if self.error_callback is not None:
+            self.error_callback(message)
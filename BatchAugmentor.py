@@ -0,0 +1,269 @@
+import random
+import time
+import warnings
+import cv2
+import numpy
+from Utilities import Utilities
+
+# Все варианты одного изображения проходят пайплайн albumentations синхронно, по шагам.
+# Поканальные точечные аугментации (RandomBrightnessContrast, RandomGamma, RGBShift)
+# и ChannelShuffle не применяются сразу: для каждого варианта копится одна таблица
+# подстановки (LUT) с перестановкой каналов, которые применяются за один проход.
+# HueSaturationValue переводит одинаковые исходники в HSV один раз, а обратно
+# все варианты одного размера - одним вызовом cv2.cvtColor.
+# Остальные аугментации выполняет сам albumentations. Параметры выбираются методами
+# самих аугментаций, а таблицы строятся их же apply, поэтому распределение
+# результатов совпадает с обычным вызовом пайплайна.
+# С seeds у каждого варианта свои генераторы случайных чисел (как после set_random_seed(seed)):
+# вариант воспроизводится по seed и не зависит от того, какие еще варианты в пакете.
+# Пакетный путь опирается на внутренние API albumentations 2.0.x и albucore (версии закреплены в
+# requirements.txt); если их нет, варианты с предупреждением аугментируются по одному.
+class BatchAugmentor:
+    LUT = "lut"
+    SHUFFLE = "shuffle"
+    HSV = "hsv"
+    _RAMP = numpy.repeat(numpy.arange(256, dtype=numpy.uint8).reshape(256, 1, 1), 3, axis=2)
+    _CHANNELS = numpy.arange(3)
+    _COMPOSE_API = ("preprocess", "postprocess", "check_data_post_transform")
+    _TRANSFORM_API = ("should_apply", "get_params", "update_transform_params", "get_params_dependent_on_data",
+                      "apply", "random_generator", "py_random")
+    _internals = None       # Результат проверки модулей: None - еще не проверялись
+
+    @staticmethod
+    def transform_kinds(pipeline):
+        import albumentations as A
+        from albumentations.core.transforms_interface import BasicTransform
+
+        kinds = []
+        for transform in pipeline.transforms:
+            if isinstance(transform, (A.RandomBrightnessContrast, A.RandomGamma, A.RGBShift)):
+                kinds.append(BatchAugmentor.LUT)
+            elif isinstance(transform, A.ChannelShuffle):
+                kinds.append(BatchAugmentor.SHUFFLE)
+            elif isinstance(transform, A.HueSaturationValue):
+                kinds.append(BatchAugmentor.HSV)
+            elif isinstance(transform, BasicTransform):
+                kinds.append(None)
+            else:
+                # Вложенные композиции (OneOf и т.п.) не разбираются
+                return None
+        return kinds
+
+    @staticmethod
+    def supports(pipeline, image, kinds):
+        return (
+            kinds is not None and any(kinds) and pipeline.p >= 1
+            and image.dtype == numpy.uint8 and image.ndim == 3 and image.shape[2] == 3
+            and BatchAugmentor.internals_available(pipeline)
+        )
+
+    @staticmethod
+    def internals_available(pipeline):
+        if BatchAugmentor._internals is None:
+            try:
+                from albucore import add_constant
+                from albucore.functions import sz_lut
+                BatchAugmentor._internals = True
+            except ImportError:
+                BatchAugmentor._internals = False
+        missing = [name for name in BatchAugmentor._COMPOSE_API if not hasattr(pipeline, name)] + [
+            f"{type(transform).__name__}.{name}"
+            for transform in pipeline.transforms for name in BatchAugmentor._TRANSFORM_API if not hasattr(transform, name)
+        ]
+        if not BatchAugmentor._internals:
+            missing.append("albucore.functions.sz_lut/albucore.add_constant")
+        if missing:
+            warnings.warn(
+                "BatchAugmentor: несовместимая версия albumentations/albucore (нет " + ", ".join(missing)
+                + "), варианты аугментируются по одному", RuntimeWarning,
+            )
+            return False
+        return True
+
+    @staticmethod
+    def augment_variants(pipeline, image, bboxes, labels, count, attempts=3, profiler=None, failures=None, seeds=None):
+        # Возвращает список (ok, image, bboxes, labels), как Utilities.attempt_augmentation;
+        # seeds - seed каждого варианта (None - общие генераторы пайплайна)
+        seeds = seeds if seeds is not None else [None] * count
+        kinds = BatchAugmentor.transform_kinds(pipeline)
+        if not BatchAugmentor.supports(pipeline, image, kinds):
+            results = []
+            for seed in seeds:
+                if seed is not None:
+                    pipeline.set_random_seed(seed)
+                results.append(Utilities.attempt_augmentation(pipeline, image, bboxes, labels, attempts, profiler, failures))
+            return results
+
+        variants = []
+        for seed in seeds:
+            data = {"image": image}
+            if bboxes is not None and labels is not None:
+                data["bboxes"] = bboxes
+                data["labels"] = labels
+            variant = {"data": data, "perm": None, "lut": None, "failed": None, "random": None}
+            if seed is not None:
+                # Как set_random_seed: у каждой аугментации свои генераторы с одним seed
+                variant["random"] = [(numpy.random.default_rng(seed), random.Random(seed)) for _ in pipeline.transforms]
+            BatchAugmentor.run_step(variant, lambda data: pipeline.preprocess(data) or data)
+            variants.append(variant)
+
+        for position, (transform, kind) in enumerate(zip(pipeline.transforms, kinds)):
+            active = [variant for variant in variants if not variant["failed"]]
+            start = time.perf_counter()
+            if kind is None:
+                for variant in active:
+                    BatchAugmentor.use_random(transform, position, variant)
+                    # Накопленные таблицы применяются до любой не точечной аугментации: порядок как в пайплайне
+                    BatchAugmentor.run_step(
+                        variant, lambda data: pipeline.check_data_post_transform(transform(**BatchAugmentor.flush(variant)))
+                    )
+                continue
+
+            if kind == BatchAugmentor.HSV:
+                BatchAugmentor.shift_hsv(transform, active, position)
+            else:
+                for variant in active:
+                    BatchAugmentor.use_random(transform, position, variant)
+                    BatchAugmentor.run_step(variant, lambda data: BatchAugmentor.accumulate(transform, kind, variant))
+            if profiler is not None:
+                profiler.record(f"batched.{type(transform).__name__}", time.perf_counter() - start)
+
+        results = []
+        for variant in variants:
+            if not variant["failed"]:
+                BatchAugmentor.run_step(variant, lambda data: pipeline.postprocess(BatchAugmentor.flush(variant)))
+            if variant["failed"]:
+                # Неудачный вариант повторяется обычным путем с оставшимися попытками
+                if failures is not None:
+                    failures.append(variant["failed"])
+                for position, transform in enumerate(pipeline.transforms):
+                    BatchAugmentor.use_random(transform, position, variant)
+                results.append(
+                    Utilities.attempt_augmentation(pipeline, image, bboxes, labels, attempts - 1, profiler, failures)
+                    if attempts > 1 else (False, image, None, None)
+                )
+            else:
+                data = variant["data"]
+                results.append((True, data["image"], data.get("bboxes"), data.get("labels")))
+        return results
+
+    @staticmethod
+    def use_random(transform, position, variant):
+        # Генераторы варианта подставляются перед каждым вызовом аугментации
+        if variant["random"] is not None:
+            transform.random_generator, transform.py_random = variant["random"][position]
+
+    @staticmethod
+    def run_step(variant, step):
+        try:
+            variant["data"] = step(variant["data"])
+        except Exception as e:
+            variant["failed"] = f"{type(e).__name__}: {e}"
+
+    @staticmethod
+    def sample_params(transform, data):
+        params = transform.update_transform_params(transform.get_params(), data)
+        params.update(transform.get_params_dependent_on_data(params, data))
+        return params
+
+    @staticmethod
+    def accumulate(transform, kind, variant):
+        # Таблица варианта: (256,) - общая для всех каналов, (3, 256) - своя для каждого канала
+        data = variant["data"]
+        if not transform.should_apply():
+            return data
+        # Яркость относительно среднего зависит от текущих пикселей
+        if kind == BatchAugmentor.LUT and getattr(transform, "brightness_by_max", True) is False:
+            BatchAugmentor.flush(variant)
+        params = BatchAugmentor.sample_params(transform, data)
+
+        if kind == BatchAugmentor.SHUFFLE:
+            order = params["channels_shuffled"]
+            if order is None:
+                return data
+            variant["perm"] = (BatchAugmentor._CHANNELS if variant["perm"] is None else variant["perm"])[order]
+            if variant["lut"] is not None and variant["lut"].ndim == 2:
+                variant["lut"] = variant["lut"][order]
+            return data
+
+        table = numpy.ascontiguousarray(transform.apply(BatchAugmentor._RAMP.copy(), **params).reshape(256, 3).T)
+        if (table == table[0]).all():
+            table = table[0]
+        if variant["lut"] is None:
+            variant["lut"] = table
+        elif table.ndim == 1:
+            variant["lut"] = table[variant["lut"]]
+        else:
+            variant["lut"] = table[BatchAugmentor._CHANNELS[:, None], variant["lut"]]
+        return data
+
+    @staticmethod
+    def flush(variant):
+        data = variant["data"]
+        if variant["perm"] is not None or variant["lut"] is not None:
+            data["image"] = BatchAugmentor.apply_tables(data["image"], variant["perm"], variant["lut"])
+            variant["perm"] = variant["lut"] = None
+        return data
+
+    @staticmethod
+    def apply_tables(image, perm, lut, dst=None):
+        # out[..., c] = lut[c][image[..., perm[c]]]; исходное изображение не изменяется
+        from albucore.functions import sz_lut
+
+        if lut is not None and lut.ndim == 2:
+            channels = cv2.split(image)
+            order = perm if perm is not None else BatchAugmentor._CHANNELS
+            return cv2.merge([sz_lut(channels[source], lut[channel]) for channel, source in enumerate(order)], dst=dst)
+
+        if perm is not None:
+            output = numpy.empty_like(image) if dst is None else dst
+            pairs = [value for channel, source in enumerate(perm) for value in (int(source), channel)]
+            cv2.mixChannels([numpy.ascontiguousarray(image)], [output], pairs)
+            return sz_lut(output, lut) if lut is not None else output
+        if dst is not None:
+            dst[...] = image
+            return sz_lut(dst, lut) if lut is not None else dst
+        return sz_lut(image, lut, inplace=False)
+
+    @staticmethod
+    def shift_hsv(transform, variants, position):
+        groups = {}
+        for variant in variants:
+            BatchAugmentor.use_random(transform, position, variant)
+            try:
+                if not transform.should_apply():
+                    continue
+                params = BatchAugmentor.sample_params(transform, variant["data"])
+                BatchAugmentor.flush(variant)
+            except Exception as e:
+                variant["failed"] = f"{type(e).__name__}: {e}"
+                continue
+            groups.setdefault(variant["data"]["image"].shape, []).append((variant, params))
+
+        for (height, width, _), group in groups.items():
+            # Одинаковые исходники (варианты, к которым еще ничего не применялось) переводятся в HSV один раз
+            sources = {}
+            hsv = numpy.empty((len(group) * height, width, 3), dtype=numpy.uint8)
+            for index, (variant, params) in enumerate(group):
+                image = variant["data"]["image"]
+                source = sources.get(id(image))
+                if source is None:
+                    source = sources[id(image)] = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
+                BatchAugmentor.apply_tables(source, None, BatchAugmentor.hsv_table(params), hsv[index * height:(index + 1) * height])
+            # Обратно в RGB все варианты одного размера переводятся одним вызовом
+            rgb = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
+            for index, (variant, _) in enumerate(group):
+                variant["data"]["image"] = rgb[index * height:(index + 1) * height]
+
+    @staticmethod
+    def hsv_table(params):
+        # Те же таблицы, что строит albumentations.augmentations.pixel.functional.shift_hsv
+        from albucore import add_constant
+
+        ramp = numpy.arange(256, dtype=numpy.uint8).reshape(256, 1)
+        hue = numpy.mod(numpy.arange(0, 256, dtype=numpy.int16) + params["hue_shift"], 180).astype(numpy.uint8)
+        sat = add_constant(ramp.copy(), params["sat_shift"]).ravel()
+        # Серые пиксели (S=0) остаются серыми
+        sat[0] = 0
+        val = add_constant(ramp.copy(), params["val_shift"]).ravel()
+        return numpy.ascontiguousarray(numpy.stack((hue, sat, val)))
@@ -0,0 +1,213 @@
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy
+from Modes import Modes
+from Utilities import Utilities
+
+# Сохраняемый индекс датасета: все изображения (рекурсивно), их размеры и число рамок в разметке.
+# Повторное открытие только обходит директории и сравнивает mtime/размер файлов:
+# размеры изображений и число рамок пересчитываются лишь для новых и изменившихся файлов.
+class DatasetIndex:
+    FILE_NAME = ".dataset_index.npz"
+    DEFAULT_READERS = 8
+    # Столбцы таблицы; -1 - нет файла разметки или размер изображения не определен
+    IMAGE_MTIME, IMAGE_SIZE, WIDTH, HEIGHT, LABEL_MTIME, LABEL_SIZE, BOXES = range(7)
+    COLUMNS = 7
+    _PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    # Маркеры JPEG без длины сегмента
+    _JPEG_STANDALONE = {0x01, 0xD8} | set(range(0xD0, 0xD8))
+    # SOF0-SOF15, кроме DHT (C4), JPG (C8) и DAC (CC)
+    _JPEG_FRAME = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+    def __init__(self, directory, mode, names, table):
+        self.directory = directory
+        self.mode = mode
+        self.names = names          # Пути изображений относительно directory, по алфавиту
+        self.table = table
+        self.rows = {name: i for i, name in enumerate(names)}
+
+    @staticmethod
+    def index_path(directory):
+        return os.path.join(directory, DatasetIndex.FILE_NAME)
+
+    @staticmethod
+    def open(directory, mode=None):
+        # Последний сохраненный индекс без проверки файлов; None, если его нет или он для другого режима
+        path = DatasetIndex.index_path(directory)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with numpy.load(path) as data:
+                index = DatasetIndex(directory, Modes[str(data["mode"])], data["names"].tolist(), data["table"])
+        except (OSError, ValueError, KeyError):
+            return None
+        if mode is not None and index.mode != mode:
+            return None
+        return index
+
+    @staticmethod
+    def refresh(directory, mode=None, readers=DEFAULT_READERS, progress_callback=None):
+        mode = mode if mode is not None else Utilities.determine_mode(directory)
+        previous = DatasetIndex.open(directory, mode)
+
+        images = {
+            os.path.relpath(entry.path, directory): entry.stat()
+            for entry in Utilities.walk_files(Utilities.images_root(directory, mode), Utilities.IMAGE_EXTENSIONS)
+        }
+        labels = {}
+        labels_dir = os.path.join(directory, "labels")
+        if mode == Modes.IMAGES_WITH_LABELS and os.path.isdir(labels_dir):
+            labels = {
+                os.path.relpath(entry.path, directory): entry.stat()
+                for entry in Utilities.walk_files(labels_dir, Utilities.LABEL_EXTENSIONS)
+            }
+
+        names = sorted(images)
+        table = numpy.full((len(names), DatasetIndex.COLUMNS), -1, dtype=numpy.int64)
+        stale_images, stale_labels = [], []
+        for row, name in enumerate(names):
+            stat = images[name]
+            table[row, [DatasetIndex.IMAGE_MTIME, DatasetIndex.IMAGE_SIZE]] = stat.st_mtime_ns, stat.st_size
+            label_stat = labels.get(os.path.relpath(Utilities.get_labels_path(directory, os.path.join(directory, name)), directory))
+            if label_stat is not None:
+                table[row, [DatasetIndex.LABEL_MTIME, DatasetIndex.LABEL_SIZE]] = label_stat.st_mtime_ns, label_stat.st_size
+
+            old = previous.rows.get(name) if previous is not None else None
+            old_row = previous.table[old] if old is not None else None
+            if old_row is not None and (old_row[:2] == table[row, :2]).all():
+                table[row, [DatasetIndex.WIDTH, DatasetIndex.HEIGHT]] = old_row[[DatasetIndex.WIDTH, DatasetIndex.HEIGHT]]
+            else:
+                stale_images.append(row)
+            if label_stat is None:
+                continue
+            if old_row is not None and (old_row[DatasetIndex.LABEL_MTIME:DatasetIndex.BOXES] == table[row, DatasetIndex.LABEL_MTIME:DatasetIndex.BOXES]).all():
+                table[row, DatasetIndex.BOXES] = old_row[DatasetIndex.BOXES]
+            else:
+                stale_labels.append(row)
+
+        index = DatasetIndex(directory, mode, names, table)
+        if previous is not None and not stale_images and not stale_labels and previous.names == names \
+                and (previous.table == table).all():
+            return index
+
+        # Заголовки изображений и файлы разметки читаются параллельно: основное время - ожидание диска
+        done, total = 0, len(stale_images) + len(stale_labels)
+        with ThreadPoolExecutor(max_workers=max(1, readers)) as executor:
+            sizes = executor.map(DatasetIndex.read_image_size, [index.image_path(row) for row in stale_images])
+            counts = executor.map(DatasetIndex.count_boxes, [index.label_path(index.image_path(row)) for row in stale_labels])
+            for row, size in zip(stale_images, sizes):
+                table[row, [DatasetIndex.WIDTH, DatasetIndex.HEIGHT]] = size if size is not None else (-1, -1)
+                done += 1
+                if progress_callback is not None and done % 1000 == 0:
+                    progress_callback(done, total)
+            for row, count in zip(stale_labels, counts):
+                table[row, DatasetIndex.BOXES] = count
+                done += 1
+                if progress_callback is not None and done % 1000 == 0:
+                    progress_callback(done, total)
+
+        index.save()
+        return index
+
+    def save(self):
+        path = self.index_path(self.directory)
+        # Свой временный файл у каждого процесса: несколько частей запуска могут обновлять индекс одновременно
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            numpy.savez(temp_path, mode=self.mode.name, names=numpy.array(self.names, dtype=str), table=self.table)
+            os.replace(temp_path, path)
+        except OSError:
+            # Директория только для чтения: индекс работает, но при следующем открытии строится заново
+            pass
+
+    def image_path(self, row):
+        return os.path.join(self.directory, self.names[row])
+
+    def image_paths(self):
+        return [os.path.join(self.directory, name) for name in self.names]
+
+    def label_path(self, image_path):
+        return Utilities.get_labels_path(self.directory, image_path)
+
+    def row(self, image_path):
+        row = self.rows.get(os.path.relpath(image_path, self.directory))
+        return self.table[row] if row is not None else None
+
+    def image_size(self, image_path):
+        # (ширина, высота) из заголовка файла (без учета поворота EXIF) или None
+        row = self.row(image_path)
+        if row is None or row[DatasetIndex.WIDTH] < 0:
+            return None
+        return int(row[DatasetIndex.WIDTH]), int(row[DatasetIndex.HEIGHT])
+
+    def box_count(self, image_path):
+        # None, если файла разметки нет
+        row = self.row(image_path)
+        if row is None or row[DatasetIndex.BOXES] < 0:
+            return None
+        return int(row[DatasetIndex.BOXES])
+
+    def summary(self):
+        labeled = self.table[:, DatasetIndex.BOXES] >= 0
+        return {
+            "images": len(self.names),
+            "labeled": int(labeled.sum()),
+            "boxes": int(self.table[labeled, DatasetIndex.BOXES].sum()),
+            "unreadable": int((self.table[:, DatasetIndex.WIDTH] < 0).sum()),
+        }
+
+    @staticmethod
+    def count_boxes(label_path):
+        try:
+            with open(label_path, 'rb') as file:
+                return sum(1 for line in file if line.strip())
+        except OSError:
+            return -1
+
+    @staticmethod
+    def read_image_size(image_path):
+        # Размер из заголовка PNG/BMP/JPEG без декодирования; остальное декодируется целиком
+        try:
+            with open(image_path, 'rb') as file:
+                size = DatasetIndex._header_size(file)
+        except (OSError, struct.error):
+            size = None
+        if size is not None:
+            return size
+        image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        return (image.shape[1], image.shape[0]) if image is not None else None
+
+    @staticmethod
+    def _header_size(file):
+        head = file.read(26)
+        if head[:8] == DatasetIndex._PNG_SIGNATURE and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:2] == b'BM':
+            # BITMAPCOREHEADER (12 байт) хранит 16-битные размеры, остальные - 32-битные; высота может быть отрицательной
+            if struct.unpack('<I', head[14:18])[0] == 12:
+                width, height = struct.unpack('<HH', head[18:22])
+            else:
+                width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+        if head[:2] != b'\xff\xd8':
+            return None
+
+        file.seek(2)
+        while True:
+            marker = file.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # Байты-заполнители 0xFF перед маркером
+            while marker[1] == 0xFF:
+                marker = marker[1:] + file.read(1)
+                if len(marker) < 2:
+                    return None
+            if marker[1] in DatasetIndex._JPEG_STANDALONE:
+                continue
+            length = struct.unpack('>H', file.read(2))[0]
+            if marker[1] in DatasetIndex._JPEG_FRAME:
+                height, width = struct.unpack('>xHH', file.read(5))
+                return width, height
+            file.seek(length - 2, 1)
@@ -0,0 +1,21 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+from DatasetIndex import DatasetIndex
+
+# Обновление индекса датасета вне GUI-потока
+class DatasetIndexThread(QThread):
+    indexed = pyqtSignal(object)        # Готовый DatasetIndex
+    progress = pyqtSignal(int, int)     # Обработано / всего новых и изменившихся файлов
+    error = pyqtSignal(str)
+
+    def __init__(self, directory, mode, parent=None):
+        super().__init__(parent)
+        self.directory = directory
+        self.mode = mode
+
+    def run(self):
+        try:
+            index = DatasetIndex.refresh(self.directory, self.mode, progress_callback=self.progress.emit)
+        except Exception as e:
+            self.error.emit(f"Ошибка индексации директории {self.directory}: {e}")
+            return
+        self.indexed.emit(index)
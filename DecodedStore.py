@@ -0,0 +1,181 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from Utilities import Utilities
+
+# Хранилище заранее декодированных RGB-изображений для повторных запусков.
+# Файл кадров - записи подряд: сырой кадр, затем рамки (float32 N×4) и классы (int64) этого файла;
+# index.npz - имена файлов и таблица смещений, форм и сигнатур исходников.
+# Чтение возвращает представления numpy.memmap без декодирования и копирования.
+# Записи устаревших и удаленных изображений - мертвые байты: когда их доля больше COMPACT_RATIO,
+# живые записи переписываются в новый файл кадров, и индекс атомарно переключается на него.
+class DecodedStore:
+    DIRECTORY = ".decoded_cache"
+    FRAMES_PATTERN = "frames-{}.bin"
+    INDEX_NAME = "index.npz"
+    PREPARE_BATCH = 64
+    COMPACT_RATIO = 0.25
+    ALIGNMENT = 8               # Рамки и классы читаются как float32/int64 прямо из memmap
+    NO_LABELS = -1
+    # Столбцы таблицы индекса
+    OFFSET = 0
+    HEIGHT = 1
+    WIDTH = 2
+    CHANNELS = 3                # 0 - одноканальный кадр (height, width)
+    BOX_COUNT = 4               # NO_LABELS - разметки нет
+    RECORD_SIZE = 5
+    SIGNATURE = slice(6, 10)    # mtime/размер изображения и разметки, -1 - файла нет
+    COLUMNS = 10
+
+    def __init__(self, directory, mode_name, generation, names, table):
+        self.directory = directory
+        self.mode_name = mode_name
+        self.generation = generation
+        self.names = names
+        self.table = table
+        self.rows = {name: row for row, name in enumerate(names)}
+        frames_path = DecodedStore.frames_path(directory, generation)
+        # Режим "c": копирование при записи, файл на диске не изменяется
+        self.frames = numpy.memmap(frames_path, dtype=numpy.uint8, mode='c') \
+            if os.path.isfile(frames_path) and os.path.getsize(frames_path) else None
+
+    @staticmethod
+    def frames_path(directory, generation):
+        return os.path.join(directory, DecodedStore.DIRECTORY, DecodedStore.FRAMES_PATTERN.format(generation))
+
+    @staticmethod
+    def open(directory):
+        index_path = os.path.join(directory, DecodedStore.DIRECTORY, DecodedStore.INDEX_NAME)
+        if not os.path.isfile(index_path):
+            return None
+        with numpy.load(index_path) as data:
+            return DecodedStore(directory, str(data["mode"]), int(data["generation"]), data["names"].tolist(), data["table"])
+
+    @staticmethod
+    def signature_row(signature):
+        # Utilities.sources_signature -> 4 числа для таблицы
+        return [value for item in signature for value in (item if item is not None else (-1, -1))]
+
+    def get(self, mode, image_path):
+        # None, если изображения нет в хранилище или исходные файлы изменились
+        row = self.rows.get(os.path.relpath(image_path, self.directory))
+        if row is None or self.frames is None or self.mode_name != mode.name:
+            return None
+        entry = self.table[row]
+        if entry[self.SIGNATURE].tolist() != self.signature_row(Utilities.sources_signature(mode, self.directory, image_path)):
+            return None
+
+        offset, height, width, channels, box_count = (int(value) for value in entry[:self.RECORD_SIZE])
+        size = height * width * max(channels, 1)
+        image = self.frames[offset:offset + size].reshape((height, width, channels) if channels else (height, width))
+        if box_count == self.NO_LABELS:
+            return image, None, None
+        boxes_offset = offset + self.padded(size)
+        classes_offset = boxes_offset + box_count * 16
+        bboxes = self.frames[boxes_offset:classes_offset].view(numpy.float32).reshape(-1, 4)
+        return image, bboxes, self.frames[classes_offset:classes_offset + box_count * 8].view(numpy.int64)
+
+    @staticmethod
+    def padded(size):
+        return size + (-size) % DecodedStore.ALIGNMENT
+
+    @staticmethod
+    def write_record(file, image, bboxes, labels):
+        # Возвращает строку таблицы без сигнатуры; запись выровнена по ALIGNMENT
+        offset = file.tell()
+        image = numpy.ascontiguousarray(image)
+        file.write(image.data)
+        box_count = DecodedStore.NO_LABELS
+        if bboxes is not None and labels is not None:
+            file.write(b"\0" * ((-image.nbytes) % DecodedStore.ALIGNMENT))
+            classes = numpy.ascontiguousarray(labels, dtype=numpy.int64).reshape(-1)
+            file.write(numpy.ascontiguousarray(bboxes, dtype=numpy.float32).reshape(-1, 4).data)
+            file.write(classes.data)
+            box_count = len(classes)
+        file.write(b"\0" * ((-(file.tell() - offset)) % DecodedStore.ALIGNMENT))
+        height, width = image.shape[:2]
+        channels = image.shape[2] if image.ndim == 3 else 0
+        return [offset, height, width, channels, box_count, file.tell() - offset]
+
+    @staticmethod
+    def prepare(directory, mode, image_paths, workers=4, progress_callback=None, error_callback=None):
+        # Дописывает в хранилище новые и изменившиеся изображения; актуальные записи не трогает,
+        # записи изображений, которых больше нет в списке, удаляются
+        store_dir = os.path.join(directory, DecodedStore.DIRECTORY)
+        os.makedirs(store_dir, exist_ok=True)
+
+        existing = DecodedStore.open(directory)
+        if existing is not None and existing.mode_name == mode.name:
+            generation, rows = existing.generation, {name: existing.table[row] for name, row in existing.rows.items()}
+        else:
+            # Смена режима или первый запуск - хранилище пересоздается
+            generation, rows = (existing.generation + 1 if existing is not None else 0), {}
+        frames_path = DecodedStore.frames_path(directory, generation)
+        if not rows:
+            open(frames_path, 'wb').close()
+
+        live, stale = {}, []
+        for image_path in image_paths:
+            name = os.path.relpath(image_path, directory)
+            row = rows.get(name)
+            if row is not None and row[DecodedStore.SIGNATURE].tolist() == DecodedStore.signature_row(
+                    Utilities.sources_signature(mode, directory, image_path)):
+                live[name] = row.tolist()
+            else:
+                stale.append(image_path)
+
+        def decode(image_path):
+            signature = Utilities.sources_signature(mode, directory, image_path)
+            image = Utilities.read_image(image_path)
+            bboxes, labels = Utilities.load_labels(mode, directory, image_path)
+            return signature, image, bboxes, labels
+
+        done = 0
+        with open(frames_path, 'ab') as frames, ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(stale), DecodedStore.PREPARE_BATCH):
+                batch = stale[start:start + DecodedStore.PREPARE_BATCH]
+                futures = [executor.submit(decode, path) for path in batch]
+                for image_path, future in zip(batch, futures):
+                    try:
+                        signature, image, bboxes, labels = future.result()
+                    except Exception as e:
+                        if error_callback is not None:
+                            error_callback(f"Error preparing {image_path}: {e}")
+                        continue
+                    live[os.path.relpath(image_path, directory)] = \
+                        DecodedStore.write_record(frames, image, bboxes, labels) + DecodedStore.signature_row(signature)
+
+                done += len(batch)
+                if progress_callback is not None:
+                    progress_callback(int(done / len(stale) * 100))
+
+        names = list(live)
+        table = numpy.array([live[name] for name in names], dtype=numpy.int64).reshape(-1, DecodedStore.COLUMNS)
+        dead_bytes = os.path.getsize(frames_path) - int(table[:, DecodedStore.RECORD_SIZE].sum())
+        if dead_bytes > DecodedStore.COMPACT_RATIO * os.path.getsize(frames_path):
+            generation = DecodedStore.compact(directory, generation, table)
+
+        # Индекс заменяется атомарно: до замены он указывает на прежний, целый файл кадров
+        index_path = os.path.join(store_dir, DecodedStore.INDEX_NAME)
+        temp_path = index_path + ".tmp.npz"
+        numpy.savez(temp_path, mode=mode.name, generation=generation, names=numpy.array(names, dtype=str), table=table)
+        os.replace(temp_path, index_path)
+        # Файлы кадров прошлых поколений (после сжатия или смены режима) больше не нужны
+        current = DecodedStore.frames_path(directory, generation)
+        for path in glob.glob(os.path.join(store_dir, DecodedStore.FRAMES_PATTERN.format("*"))):
+            if path != current:
+                os.remove(path)
+        return len(stale)
+
+    @staticmethod
+    def compact(directory, generation, table):
+        # Живые записи переписываются подряд в файл следующего поколения; смещения в table обновляются
+        with open(DecodedStore.frames_path(directory, generation), 'rb') as source, \
+                open(DecodedStore.frames_path(directory, generation + 1), 'wb') as target:
+            for row in numpy.argsort(table[:, DecodedStore.OFFSET], kind="stable"):
+                source.seek(int(table[row, DecodedStore.OFFSET]))
+                data = source.read(int(table[row, DecodedStore.RECORD_SIZE]))
+                table[row, DecodedStore.OFFSET] = target.tell()
+                target.write(data)
+        return generation + 1
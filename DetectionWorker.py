@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# Инференс YOLO вне GUI-потока. Из запросов на обнаружение выполняется только последний:
+# при листании устаревшие запросы отменяются, не дойдя до модели. Результаты хранятся
+# в ограниченном LRU-кэше по хэшу содержимого кадра и пути весов, поэтому повторное
+# обнаружение на том же кадре и возврат к уже просмотренному изображению не запускают модель.
+class DetectionWorker(QThread):
+    detected = pyqtSignal(object)       # dict: token, bboxes (N×4 xywhn), classes, cached
+    loaded = pyqtSignal(str)            # Путь загруженных весов
+    error = pyqtSignal(str)
+    CACHE_SIZE = 256
+
+    def __init__(self, yolo_model, cache_size=CACHE_SIZE, parent=None):
+        super().__init__(parent)
+        self.yolo_model = yolo_model
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()     # Используется только из потока воркера
+        self._condition = threading.Condition()
+        self._request = None
+        self._weights = []
+        self._is_running = True
+
+    def detect(self, token, image):
+        with self._condition:
+            self._request = {"token": token, "image": image}
+            self._condition.notify()
+
+    def cancel(self):
+        # Ожидающий запрос больше не нужен (показано другое изображение)
+        with self._condition:
+            self._request = None
+
+    def load_weights(self, weights_path):
+        # Загрузка весов не отменяется и выполняется раньше обнаружения
+        with self._condition:
+            self._weights.append(weights_path)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+    @staticmethod
+    def content_hash(image):
+        image = numpy.ascontiguousarray(image)
+        digest = hashlib.blake2b(image.data, digest_size=16)
+        digest.update(f"{image.shape}{image.dtype}".encode('ascii'))
+        return digest.hexdigest()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._is_running and self._request is None and not self._weights:
+                    self._condition.wait()
+                if not self._is_running:
+                    return
+                if self._weights:
+                    weights_path, request = self._weights.pop(0), None
+                else:
+                    weights_path, request = None, self._request
+                    self._request = None
+
+            if weights_path is not None:
+                try:
+                    self.yolo_model.load(weights_path)
+                    # Первый инференс инициализирует модель, чтобы первое обнаружение было быстрым
+                    self.yolo_model.warm_up()
+                except Exception as e:
+                    self.error.emit(f"Ошибка загрузки весов по пути: {weights_path}: {e}")
+                    continue
+                self.loaded.emit(weights_path)
+                continue
+
+            try:
+                self.detected.emit(self.run_detection(request))
+            except Exception as e:
+                self.error.emit(f"Ошибка обнаружения: {e}")
+
+    def run_detection(self, request):
+        if self.yolo_model.model is None:
+            self.yolo_model.load()
+        key = (self.content_hash(request["image"]), self.yolo_model.weights_path)
+        result = self._cache.get(key)
+        cached = result is not None
+        if cached:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            result = self.yolo_model.predict(request["image"])
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        bboxes, classes = result
+        return {"token": request["token"], "bboxes": bboxes, "classes": classes, "cached": cached}
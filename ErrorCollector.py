@@ -0,0 +1,91 @@
+import json
+import threading
+import traceback
+
+# Потокобезопасный сбор ошибок запуска без диалогов и блокировок воркеров.
+# Ошибки группируются по виду (стадия + тип исключения); для каждого вида хранятся
+# первые SAMPLES_PER_KIND примеров. Файл с ошибкой пропускается, пока не превышен порог:
+# max_errors - всего ошибок, max_error_rate - доля файлов с ошибками среди обработанных.
+class ErrorCollector:
+    REPORT_NAME = "error_report.json"
+    SAMPLES_PER_KIND = 20
+    MIN_ITEMS_FOR_RATE = 20     # Раньше доля ошибок слишком случайна для остановки
+
+    def __init__(self, max_errors=None, max_error_rate=None):
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.total = 0
+        self.items = 0
+        self.kinds = {}             # вид -> {"count", "samples"}
+        self.failed_paths = set()
+        self.abort_reason = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def kind(stage, error):
+        return f"{stage}: {type(error).__name__}"
+
+    def count_item(self):
+        with self._lock:
+            self.items += 1
+
+    def add(self, path, stage, error):
+        # Возвращает True, если после этой ошибки запуск нужно остановить (один раз)
+        kind = self.kind(stage, error)
+        sample = {"path": path, "stage": stage, "message": str(error)}
+        if error.__traceback__ is not None:
+            sample["location"] = traceback.format_tb(error.__traceback__)[-1].strip()
+
+        with self._lock:
+            self.total += 1
+            self.failed_paths.add(path)
+            entry = self.kinds.setdefault(kind, {"count": 0, "samples": []})
+            entry["count"] += 1
+            if len(entry["samples"]) < self.SAMPLES_PER_KIND:
+                entry["samples"].append(sample)
+            if self.abort_reason is not None:
+                return False
+            self.abort_reason = self._check_thresholds()
+            return self.abort_reason is not None
+
+    def abort(self, reason):
+        # Остановка не из-за порогов (например, ошибка подготовки запуска)
+        with self._lock:
+            if self.abort_reason is None:
+                self.abort_reason = reason
+
+    def _check_thresholds(self):
+        if self.max_errors is not None and self.total > self.max_errors:
+            return f"ошибок больше {self.max_errors}"
+        if self.max_error_rate is not None and self.items >= self.MIN_ITEMS_FOR_RATE \
+                and len(self.failed_paths) / self.items > self.max_error_rate:
+            return f"доля файлов с ошибками больше {self.max_error_rate:.0%}"
+        return None
+
+    def summary(self):
+        with self._lock:
+            return {
+                "errors": self.total,
+                "failed_files": len(self.failed_paths),
+                "processed_files": self.items,
+                "aborted": self.abort_reason,
+                "kinds": {kind: entry["count"] for kind, entry in sorted(self.kinds.items(), key=lambda item: -item[1]["count"])},
+            }
+
+    def format_summary(self, limit=5):
+        # Несколько самых частых видов ошибок с примером файла для итогового сообщения
+        summary = self.summary()
+        lines = [f"Ошибок: {summary['errors']} (файлов: {summary['failed_files']})"]
+        if summary["aborted"]:
+            lines.append(f"Запуск остановлен: {summary['aborted']}")
+        with self._lock:
+            for kind, count in list(summary["kinds"].items())[:limit]:
+                lines.append(f"  {kind}: {count}, например {self.kinds[kind]['samples'][0]['path']}")
+        return "\n".join(lines)
+
+    def write_report(self, path):
+        summary = self.summary()
+        with self._lock:
+            kinds = {kind: {"count": self.kinds[kind]["count"], "samples": list(self.kinds[kind]["samples"])} for kind in summary["kinds"]}
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({**summary, "kinds": kinds}, file, indent=2, ensure_ascii=False)
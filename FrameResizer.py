@@ -0,0 +1,43 @@
+import cv2
+import numpy
+
+# Приведение кадра к целевому размеру сразу после декодирования.
+# "fit" уменьшает так, чтобы длинная сторона стала target_size (YOLO-рамки в долях не меняются),
+# "letterbox" вписывает в квадрат target_size×target_size с серыми полями и пересчитывает рамки.
+# Кадры меньше целевого размера не увеличиваются.
+class FrameResizer:
+    MODE_FIT = "fit"
+    MODE_LETTERBOX = "letterbox"
+    MODES = (MODE_FIT, MODE_LETTERBOX)
+    PAD_VALUE = 114     # Цвет полей, как в YOLO
+
+    def __init__(self, target_size, mode=MODE_FIT):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный режим изменения размера: {mode}")
+        if target_size <= 0:
+            raise ValueError(f"Целевой размер должен быть положительным: {target_size}")
+        self.target_size = int(target_size)
+        self.mode = mode
+
+    def resize(self, image, bboxes=None):
+        height, width = image.shape[:2]
+        scale = min(1.0, self.target_size / max(height, width))
+        if scale < 1.0:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        if self.mode == self.MODE_FIT:
+            return image, bboxes
+
+        resized_height, resized_width = image.shape[:2]
+        top = (self.target_size - resized_height) // 2
+        left = (self.target_size - resized_width) // 2
+        canvas = numpy.full((self.target_size, self.target_size) + image.shape[2:], self.PAD_VALUE, dtype=image.dtype)
+        canvas[top:top + resized_height, left:left + resized_width] = image
+
+        if bboxes is not None and len(bboxes):
+            # Доли исходного кадра -> доли квадрата с полями
+            bboxes = numpy.asarray(bboxes, dtype=numpy.float32).reshape(-1, 4)
+            factor = numpy.array([resized_width, resized_height] * 2, dtype=numpy.float32) / self.target_size
+            offset = numpy.array([left, top, 0, 0], dtype=numpy.float32) / self.target_size
+            bboxes = bboxes * factor + offset
+        return canvas, bboxes
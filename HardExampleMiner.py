@@ -0,0 +1,158 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from Utilities import Utilities
+
+# Оценка сложности исходных изображений моделью YOLO: предсказания сравниваются с разметкой.
+# Рамки сопоставляются жадно по убыванию IoU (только одного класса); для изображения считаются
+# recall (доля найденных рамок с IoU >= IOU_THRESHOLD), средний IoU по рамкам разметки
+# (0 для ненайденных) и число ложных срабатываний. Сложность = max(1 - средний IoU, доля ложных):
+# изображения, на которых модель уже все находит точно, получают 0 и не аугментируются.
+# Оценки сохраняются в отчет и при следующем запуске с теми же весами переиспользуются.
+class HardExampleMiner:
+    REPORT_NAME = "hard_examples.json"
+    DEFAULT_BATCH_SIZE = 16
+    DEFAULT_CONFIDENCE = 0.25
+    IOU_THRESHOLD = 0.5
+    EASY_IOU = 0.75             # Средний IoU, начиная с которого изображение без промахов считается простым
+
+    def __init__(self, scores, reused=0):
+        self.scores = scores        # Имя изображения -> оценка (см. score_image)
+        self.reused = reused
+
+    @staticmethod
+    def iou_matrix(first, second):
+        # IoU всех пар рамок YOLO (xywhn): матрица len(first)×len(second)
+        first = numpy.asarray(first, dtype=numpy.float64).reshape(-1, 4)
+        second = numpy.asarray(second, dtype=numpy.float64).reshape(-1, 4)
+        first_min, first_max = first[:, None, :2] - first[:, None, 2:] / 2, first[:, None, :2] + first[:, None, 2:] / 2
+        second_min, second_max = second[None, :, :2] - second[None, :, 2:] / 2, second[None, :, :2] + second[None, :, 2:] / 2
+        overlap = numpy.clip(numpy.minimum(first_max, second_max) - numpy.maximum(first_min, second_min), 0, None).prod(axis=2)
+        union = first[:, None, 2:].prod(axis=2) + second[None, :, 2:].prod(axis=2) - overlap
+        return numpy.divide(overlap, union, out=numpy.zeros_like(overlap), where=union > 0)
+
+    @staticmethod
+    def score_image(bboxes, labels, predicted_bboxes, predicted_classes, iou_threshold=IOU_THRESHOLD, easy_iou=EASY_IOU):
+        count = len(labels) if labels is not None else 0
+        predicted = len(predicted_classes)
+        best = numpy.zeros(count)
+        if count and predicted:
+            iou = HardExampleMiner.iou_matrix(bboxes, predicted_bboxes)
+            iou[numpy.asarray(labels).reshape(-1, 1) != numpy.asarray(predicted_classes).reshape(1, -1)] = 0
+            # Жадное сопоставление один к одному; пары с IoU ниже порога учитываются в среднем IoU
+            used_targets, used_predictions = numpy.zeros(count, dtype=bool), numpy.zeros(predicted, dtype=bool)
+            for flat in numpy.argsort(-iou, axis=None, kind="stable"):
+                target, prediction = divmod(int(flat), predicted)
+                if iou[target, prediction] <= 0:
+                    break
+                if not used_targets[target] and not used_predictions[prediction]:
+                    best[target] = iou[target, prediction]
+                    used_targets[target] = used_predictions[prediction] = True
+        matched = int((best >= iou_threshold).sum())
+        false_positives = predicted - matched
+        recall = matched / count if count else 1.0
+        mean_iou = float(best.mean()) if count else 1.0
+        false_share = false_positives / (predicted + count - matched) if false_positives else 0.0
+
+        hardness = max(1.0 - mean_iou, false_share)
+        if matched == count and not false_positives and mean_iou >= easy_iou:
+            hardness = 0.0
+        return {
+            "boxes": count,
+            "predicted": predicted,
+            "recall": recall,
+            "mean_iou": mean_iou,
+            "false_positives": false_positives,
+            "hardness": hardness,
+        }
+
+    @staticmethod
+    def mine(yolo_model, directory, mode, image_paths, load_labels, report_path=None, batch_size=DEFAULT_BATCH_SIZE,
+             confidence=DEFAULT_CONFIDENCE, readers=1, progress_callback=None, error_callback=None, is_running=None):
+        # load_labels(image_path) -> (bboxes, labels); report_path - отчет прошлого запуска для повторного использования
+        if yolo_model.model is None:
+            yolo_model.load()
+        settings = {"weights": str(yolo_model.weights_path), "confidence": confidence, "iou_threshold": HardExampleMiner.IOU_THRESHOLD}
+
+        previous = {}
+        if report_path is not None and os.path.isfile(report_path):
+            try:
+                with open(report_path, 'r', encoding='utf-8') as file:
+                    report = json.load(file)
+                if report.get("settings") == settings:
+                    previous = report.get("images", {})
+            except (OSError, ValueError):
+                previous = {}
+
+        scores, pending = {}, []
+        for image_path in image_paths:
+            name = os.path.relpath(image_path, directory)
+            signature = Utilities.sources_signature(mode, directory, image_path)
+            entry = previous.get(name)
+            if entry is not None and entry.get("signature") == signature:
+                scores[name] = entry
+            else:
+                pending.append((image_path, name, signature))
+        reused = len(scores)
+
+        with ThreadPoolExecutor(max_workers=max(1, readers)) as executor:
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            for number, batch in enumerate(batches):
+                if is_running is not None and not is_running():
+                    break
+                # Ultralytics ожидает numpy-изображения в BGR
+                loaded = list(executor.map(lambda item: HardExampleMiner._load(item[0], load_labels), batch))
+                items = []
+                for (image_path, name, signature), (value, exception) in zip(batch, loaded):
+                    if exception is not None:
+                        if error_callback is not None:
+                            error_callback(f"Error reading {image_path}: {exception}")
+                        continue
+                    items.append((name, signature, value))
+                if not items:
+                    continue
+
+                try:
+                    detections = yolo_model.detect_batch([value[0] for _, _, value in items], confidence)
+                except Exception as e:
+                    if error_callback is not None:
+                        error_callback(f"Ошибка обнаружения: {e}")
+                    continue
+                for (name, signature, (_, bboxes, labels)), (predicted_bboxes, predicted_classes) in zip(items, detections):
+                    scores[name] = {"signature": signature, **HardExampleMiner.score_image(bboxes, labels, predicted_bboxes, predicted_classes)}
+
+                if progress_callback is not None:
+                    progress_callback(int(min(len(pending), (number + 1) * batch_size) / len(pending) * 100))
+
+        miner = HardExampleMiner(scores, reused)
+        if report_path is not None:
+            miner.write_report(report_path, settings)
+        return miner
+
+    @staticmethod
+    def _load(image_path, load_labels):
+        try:
+            image = Utilities.read_image_bgr(image_path)
+            bboxes, labels = load_labels(image_path)
+        except Exception as e:
+            return None, e
+        return (image, bboxes, labels), None
+
+    def hardness(self, name):
+        # Изображения без оценки (ошибка чтения, прерванный запуск) считаются сложными
+        entry = self.scores.get(name)
+        return entry["hardness"] if entry is not None else 1.0
+
+    def summary(self):
+        values = [entry["hardness"] for entry in self.scores.values()]
+        return {
+            "scored": len(values),
+            "reused": self.reused,
+            "easy": sum(1 for value in values if value == 0),
+            "mean_recall": float(numpy.mean([entry["recall"] for entry in self.scores.values()])) if values else None,
+        }
+
+    def write_report(self, path, settings):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({"settings": settings, **self.summary(), "images": self.scores}, file, indent=2, ensure_ascii=False)
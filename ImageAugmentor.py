@@ -1,7 +1,24 @@
-import albumentations as A
 from Modes import Modes
 
+# albumentations импортируется при первой сборке пайплайна, а не при старте приложения
+
 class ImageAugmentor:
+    DEFAULT_AUGMENTATIONS = [
+        "Affine", "CLAHE", "ChannelShuffle", "ChromaticAberration",
+        "CoarseDropout", "ColorJitter", "D4", "Downscale",
+        "HueSaturationValue", "ISONoise", "Morphological",
+        "MotionBlur", "OpticalDistortion",
+        "PixelDropout", "RGBShift", "RandomBrightnessContrast",
+        "RandomGamma", "RandomGravel", "RandomRain", "Sharpen", "Spatter"
+    ]
+
+    @staticmethod
+    def default_settings(probability):
+        # Состояния параметров аугментации (все включены по умолчанию)
+        return {
+            aug: {"enabled": True, "probability": probability} for aug in ImageAugmentor.DEFAULT_AUGMENTATIONS
+        }
+
     @staticmethod
     def augment_image(image, pipeline, bboxes=None, labels=None):
         data = {"image": image}
@@ -12,8 +29,14 @@ class ImageAugmentor:
         augmented = pipeline(**data)
         return augmented['image'], augmented.get('bboxes', None), augmented.get('labels', None)
     
+    @staticmethod
+    def preload():
+        import albumentations
+
     @staticmethod
     def update_pipeline(settings, mode):
+        import albumentations as A
+
         transforms = []
         for aug, config in settings.items():
             if config["enabled"]:
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# LRU-кэш декодированных изображений и разметки с ограничением по памяти.
+# loader(path) -> (image, bboxes, labels). Записи проверяются по signature(path),
+# по умолчанию - mtime и размеру файла изображения (с разметкой - Utilities.sources_signature).
+# clear() начинает новое поколение: фоновые загрузки прошлого поколения в кэш не попадают.
+class ImageCache:
+    DEFAULT_MAX_MB = 512
+    PREFETCH_WORKERS = 2
+
+    def __init__(self, loader, max_mb=DEFAULT_MAX_MB, signature=None):
+        self.loader = loader
+        self.signature = signature if signature is not None else ImageCache.file_signature
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._generation = 0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=self.PREFETCH_WORKERS)
+
+    def get(self, path):
+        with self._lock:
+            entry = self._lookup(path)
+            if entry is not None:
+                self.hits += 1
+                return entry["value"]
+            pending = self._pending.get(path)
+            self.misses += 1
+
+        # Если изображение уже декодируется в фоне - дожидаемся его
+        if pending is not None:
+            try:
+                return pending.result()
+            except Exception:
+                pass
+        return self._load(path)
+
+    def prefetch(self, paths):
+        with self._lock:
+            for path in paths:
+                if path in self._pending or self._lookup(path, touch=False) is not None:
+                    continue
+                future = self._executor.submit(self._load, path, self._generation)
+                self._pending[path] = future
+                future.add_done_callback(lambda done, p=path: self._discard_pending(p, done))
+
+    @staticmethod
+    def file_signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def _discard_pending(self, path, future):
+        with self._lock:
+            if self._pending.get(path) is future:
+                del self._pending[path]
+
+    def _load(self, path, generation=None):
+        with self._lock:
+            generation = self._generation if generation is None else generation
+        signature = self.signature(path)
+        value = self.loader(path)
+        self._store(path, signature, value, generation)
+        return value
+
+    def _lookup(self, path, touch=True):
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+
+        try:
+            signature = self.signature(path)
+        except OSError:
+            signature = None
+        if signature is None or entry["signature"] != signature:
+            self._remove(path)
+            return None
+
+        if touch:
+            self._entries.move_to_end(path)
+        return entry
+
+    def _store(self, path, signature, value, generation):
+        image = value[0]
+        size = image.nbytes if image is not None else 0
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # Загрузка началась до clear(): результат относится к прошлой директории или настройкам
+            if generation != self._generation:
+                return
+            self._remove(path)
+            while self._entries and self.used_bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+            self._entries[path] = {"signature": signature, "value": value, "size": size}
+            self.used_bytes += size
+
+    def _remove(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.used_bytes -= entry["size"]
@@ -0,0 +1,40 @@
+import os
+import cv2
+
+# Кодирование аугментированных изображений в выбранный формат.
+# "source" сохраняет расширение исходного файла с параметрами OpenCV по умолчанию.
+class ImageEncoder:
+    FORMAT_SOURCE = "source"
+    FORMAT_JPEG = "jpeg"
+    FORMAT_PNG = "png"
+    FORMAT_WEBP = "webp"
+    # формат: (расширение, параметр OpenCV, уровень по умолчанию, допустимый диапазон)
+    FORMATS = {
+        FORMAT_JPEG: (".jpg", cv2.IMWRITE_JPEG_QUALITY, 95, (0, 100)),
+        FORMAT_PNG: (".png", cv2.IMWRITE_PNG_COMPRESSION, 3, (0, 9)),
+        FORMAT_WEBP: (".webp", cv2.IMWRITE_WEBP_QUALITY, 90, (1, 100)),
+    }
+
+    def __init__(self, output_format=FORMAT_SOURCE, level=None):
+        if output_format != self.FORMAT_SOURCE and output_format not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат: {output_format}")
+
+        self.output_format = output_format
+        self.params = []
+        if output_format in self.FORMATS:
+            _, flag, default_level, (low, high) = self.FORMATS[output_format]
+            level = default_level if level is None else level
+            if not low <= level <= high:
+                raise ValueError(f"Уровень {level} вне диапазона [{low}, {high}] для формата {output_format}")
+            self.params = [flag, int(level)]
+
+    def extension(self, image_path):
+        if self.output_format == self.FORMAT_SOURCE:
+            return os.path.splitext(image_path)[1]
+        return self.FORMATS[self.output_format][0]
+
+    def encode(self, image, extension):
+        ok, buffer = cv2.imencode(extension, image, self.params)
+        if not ok:
+            raise IOError(f"Не удалось закодировать изображение в {extension}")
+        return buffer
@@ -0,0 +1,87 @@
+import os
+import numpy
+from Modes import Modes
+from Utilities import Utilities
+
+# Бинарный кэш YOLO-разметки всего датасета: рамки всех файлов подряд в одном массиве,
+# offsets[i]:offsets[i + 1] - строки i-го файла. Записи проверяются по mtime/размеру файла.
+class LabelCache:
+    FILE_NAME = ".label_cache.npz"
+
+    def __init__(self, directory, names, signatures, offsets, boxes, classes):
+        self.directory = directory
+        self.index = {name: i for i, name in enumerate(names)}
+        self.signatures = signatures
+        self.offsets = offsets
+        self.boxes = boxes
+        self.classes = classes
+        # Срезы отдаются без копирования, поэтому запрещаем их изменение
+        self.boxes.flags.writeable = False
+        self.classes.flags.writeable = False
+
+    @staticmethod
+    def cache_path(directory):
+        return os.path.join(directory, LabelCache.FILE_NAME)
+
+    @staticmethod
+    def open(directory):
+        path = LabelCache.cache_path(directory)
+        if not os.path.isfile(path):
+            return None
+        with numpy.load(path) as data:
+            return LabelCache(
+                directory, data["names"].tolist(), data["signatures"], data["offsets"], data["boxes"], data["classes"]
+            )
+
+    @staticmethod
+    def build(directory, image_paths, error_callback=None):
+        names, signatures, all_boxes, all_classes = [], [], [], []
+        for image_path in image_paths:
+            label_path = Utilities.get_labels_path(directory, image_path)
+            try:
+                stat = os.stat(label_path)
+            except FileNotFoundError:
+                continue
+
+            try:
+                boxes, classes = Utilities.read_yolo_labels(label_path)
+            except Exception as e:
+                # Некорректные файлы в кэш не попадают: при чтении будет та же понятная ошибка
+                if error_callback is not None:
+                    error_callback(str(e))
+                continue
+
+            names.append(os.path.relpath(label_path, directory))
+            signatures.append((stat.st_mtime_ns, stat.st_size))
+            all_boxes.append(boxes)
+            all_classes.append(classes)
+
+        offsets = numpy.zeros(len(names) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(classes) for classes in all_classes], out=offsets[1:])
+        boxes = numpy.concatenate(all_boxes) if all_boxes else numpy.zeros((0, 4), dtype=numpy.float32)
+        classes = numpy.concatenate(all_classes) if all_classes else numpy.zeros((0,), dtype=numpy.int64)
+        signatures = numpy.array(signatures, dtype=numpy.int64).reshape(-1, 2)
+
+        temp_path = LabelCache.cache_path(directory) + ".tmp.npz"
+        numpy.savez(temp_path, names=numpy.array(names, dtype=str), signatures=signatures,
+                    offsets=offsets, boxes=boxes, classes=classes)
+        os.replace(temp_path, LabelCache.cache_path(directory))
+        return LabelCache(directory, names, signatures, offsets, boxes, classes)
+
+    def load_labels(self, mode, image_path):
+        # Аналог Utilities.load_labels: при промахе или изменении файла читает его с диска
+        if mode != Modes.IMAGES_WITH_LABELS:
+            return None, None
+
+        label_path = Utilities.get_labels_path(self.directory, image_path)
+        index = self.index.get(os.path.relpath(label_path, self.directory))
+        if index is not None:
+            try:
+                stat = os.stat(label_path)
+            except OSError:
+                stat = None
+            if stat is not None and stat.st_mtime_ns == self.signatures[index, 0] and stat.st_size == self.signatures[index, 1]:
+                start, end = self.offsets[index], self.offsets[index + 1]
+                return self.boxes[start:end], self.classes[start:end]
+
+        return Utilities.load_labels(mode, self.directory, image_path)
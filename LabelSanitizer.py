@@ -0,0 +1,119 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+from Utilities import Utilities
+
+# Проверка и исправление YOLO-разметки всего датасета перед аугментацией.
+# Рамки, выходящие за [0, 1], обрезаются, вырожденные (нулевой ширины или высоты) удаляются:
+# иначе A.BboxParams(format='yolo') бросает исключение и все попытки аугментации тратятся впустую.
+# Файлы разметки не изменяются - исправленные рамки подставляются при чтении.
+class LabelSanitizer:
+    MIN_SIZE = 1e-6     # Рамка уже этого (в долях изображения) считается вырожденной
+    REPORT_NAME = "label_report.json"
+    SCAN_BATCH = 4096   # Файлов разметки в памяти одновременно при проверке
+
+    def __init__(self, repaired, report, errors):
+        self.repaired = repaired    # image_path исправленных файлов
+        self.report = report        # путь файла разметки -> {"boxes", "clipped", "dropped"}
+        self.errors = errors        # путь файла разметки -> сообщение об ошибке чтения
+
+    @staticmethod
+    def sanitize(bboxes, labels):
+        # Возвращает (bboxes, labels, clipped, dropped), clipped/dropped - булевы маски по исходным рамкам.
+        # Углы считаются во float32, как в albumentations, поэтому исправляются ровно те рамки, которые он отклонит
+        bboxes = numpy.asarray(bboxes, dtype=numpy.float32).reshape(-1, 4)
+        labels = numpy.asarray(labels).reshape(-1)
+        corners = numpy.hstack((bboxes[:, :2] - bboxes[:, 2:] / 2, bboxes[:, :2] + bboxes[:, 2:] / 2))
+        clipped_corners = numpy.clip(corners, 0.0, 1.0)
+
+        size = clipped_corners[:, 2:] - clipped_corners[:, :2]
+        dropped = (size <= LabelSanitizer.MIN_SIZE).any(axis=1)
+        clipped = (clipped_corners != corners).any(axis=1) & ~dropped
+
+        result = bboxes.copy()
+        result[clipped, :2] = (clipped_corners[clipped, :2] + clipped_corners[clipped, 2:]) / 2
+        result[clipped, 2:] = size[clipped]
+        # Погрешность округления не должна снова выводить исправленную рамку за границы
+        for _ in range(16):
+            center, half = result[clipped, :2], result[clipped, 2:] / 2
+            outside = (center - half < 0) | (center + half > 1)
+            if not outside.any():
+                break
+            sizes = result[clipped, 2:]
+            sizes[outside] = numpy.nextafter(sizes[outside], numpy.float32(0))
+            result[clipped, 2:] = sizes
+
+        keep = ~dropped
+        return result[keep], labels[keep], clipped, dropped
+
+    @staticmethod
+    def scan(directory, image_paths, load_labels, readers=1, error_callback=None):
+        # load_labels(image_path) -> (bboxes, labels). Рамки проверяются частями по SCAN_BATCH файлов:
+        # в памяти остаются только отчет и пути исправленных файлов, сами рамки исправляются заново при чтении
+        def load(image_path):
+            try:
+                return load_labels(image_path), None
+            except Exception as e:
+                return None, e
+
+        repaired, report, errors = set(), {}, {}
+        with ThreadPoolExecutor(max_workers=max(1, readers)) as executor:
+            for start in range(0, len(image_paths), LabelSanitizer.SCAN_BATCH):
+                batch = image_paths[start:start + LabelSanitizer.SCAN_BATCH]
+                LabelSanitizer.scan_batch(directory, batch, executor.map(load, batch), repaired, report, errors, error_callback)
+        return LabelSanitizer(repaired, report, errors)
+
+    @staticmethod
+    def scan_batch(directory, image_paths, loaded, repaired, report, errors, error_callback):
+        paths, all_boxes, all_labels = [], [], []
+        for image_path, (labels, exception) in zip(image_paths, loaded):
+            if exception is not None:
+                errors[LabelSanitizer.label_name(directory, image_path)] = str(exception)
+                if error_callback is not None:
+                    error_callback(f"Error reading labels for {image_path}: {exception}")
+                continue
+            if labels[0] is None or not len(labels[0]):
+                continue
+            paths.append(image_path)
+            all_boxes.append(numpy.asarray(labels[0]).reshape(-1, 4))
+            all_labels.append(numpy.asarray(labels[1]).reshape(-1))
+        if not paths:
+            return
+
+        counts = numpy.array([len(labels) for labels in all_labels])
+        _, _, clipped, dropped = LabelSanitizer.sanitize(numpy.concatenate(all_boxes), numpy.concatenate(all_labels))
+        file_index = numpy.repeat(numpy.arange(len(paths)), counts)
+        clipped_counts = numpy.bincount(file_index, weights=clipped, minlength=len(paths)).astype(int)
+        dropped_counts = numpy.bincount(file_index, weights=dropped, minlength=len(paths)).astype(int)
+
+        for index in numpy.flatnonzero(clipped_counts + dropped_counts):
+            repaired.add(paths[index])
+            report[LabelSanitizer.label_name(directory, paths[index])] = {
+                "boxes": int(counts[index]),
+                "clipped": int(clipped_counts[index]),
+                "dropped": int(dropped_counts[index]),
+            }
+
+    @staticmethod
+    def label_name(directory, image_path):
+        return os.path.relpath(Utilities.get_labels_path(directory, image_path), directory)
+
+    def totals(self):
+        return {
+            "label_files_repaired": len(self.report),
+            "boxes_clipped": sum(entry["clipped"] for entry in self.report.values()),
+            "boxes_dropped": sum(entry["dropped"] for entry in self.report.values()),
+            "label_files_unreadable": len(self.errors),
+        }
+
+    def write_report(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({**self.totals(), "files": self.report, "errors": self.errors}, file, indent=2, ensure_ascii=False)
+
+    def load_labels(self, image_path, bboxes, labels):
+        # Рамки файлов, которые исправлялись при проверке, исправляются так же при чтении
+        if image_path not in self.repaired:
+            return bboxes, labels
+        bboxes, labels, _, _ = LabelSanitizer.sanitize(bboxes, labels)
+        return bboxes, labels
@@ -0,0 +1,166 @@
+import json
+import random
+import threading
+import cv2
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+from DatasetIndex import DatasetIndex
+from ImageAugmentor import ImageAugmentor
+from Utilities import Utilities
+
+# Подготовка превью вне GUI-потока: декодирование с уменьшением (IMREAD_REDUCED_*),
+# аугментация уменьшенного кадра, уменьшение до размера превью и только затем рисование рамок.
+# GUI получает готовые QImage. Из очереди берется только последний запрос: при быстром
+# листании промежуточные изображения не обрабатываются.
+# Сохранение аугментирует кадр полного разрешения с тем же seed. Аугментации с параметрами в пикселях
+# (Affine, CoarseDropout, OpticalDistortion и т.п.) при другом размере кадра могут выбрать другие
+# параметры, поэтому после сохранения превью заменяется на сохраненный вариант.
+class PreviewRenderer(QThread):
+    rendered = pyqtSignal(object)       # dict: token, image_path, original/augmented (QImage), кадры и рамки
+    saved = pyqtSignal(str)             # Путь сохраненного файла
+    error = pyqtSignal(str)
+    PREVIEW_SIZE = 400
+    DECODE_MIN_SIZE = 640       # Уменьшенный кадр не меньше входа YOLO, чтобы "Обнаружить" работало так же
+    REDUCED_MODES = (
+        (8, cv2.IMREAD_REDUCED_COLOR_8),
+        (4, cv2.IMREAD_REDUCED_COLOR_4),
+        (2, cv2.IMREAD_REDUCED_COLOR_2),
+    )
+
+    def __init__(self, preview_size=PREVIEW_SIZE, parent=None):
+        super().__init__(parent)
+        self.preview_size = preview_size
+        self._condition = threading.Condition()
+        self._request = None
+        self._saves = []
+        self._is_running = True
+        self._pipeline = None
+        self._pipeline_key = None
+
+    def render(self, request):
+        # request: token, image_path, load(path) -> (image, bboxes, labels), settings, mode, seed
+        with self._condition:
+            self._request = request
+            self._condition.notify()
+
+    def save(self, request, directory):
+        # request - запрос последнего показанного превью и load_full(path) для полного разрешения
+        with self._condition:
+            self._saves.append((request, directory))
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+    @staticmethod
+    def new_seed():
+        return random.getrandbits(32)
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._is_running and self._request is None and not self._saves:
+                    self._condition.wait()
+                if not self._is_running:
+                    return
+                # Сохранение важнее превью: его нельзя пропустить
+                if self._saves:
+                    save, request = self._saves.pop(0), None
+                else:
+                    save, request = None, self._request
+                    self._request = None
+
+            try:
+                if save is not None:
+                    path, result = self.save_full(*save)
+                    self.rendered.emit(result)
+                    self.saved.emit(path)
+                else:
+                    self.rendered.emit(self.render_preview(request))
+            except Exception as e:
+                path = (save[0] if save is not None else request)["image_path"]
+                self.error.emit(f"Ошибка при обработке изображения {path}: {e}")
+
+    def render_preview(self, request):
+        image, bboxes, labels = request["load"](request["image_path"])
+        return self.make_result(request, image, bboxes, labels, *self.augment(request, image, bboxes, labels)[1:])
+
+    def make_result(self, request, image, bboxes, labels, augmented_image, augmented_bboxes, augmented_labels):
+        return {
+            "token": request["token"],
+            "image_path": request["image_path"],
+            "image": image,
+            "bboxes": bboxes,
+            "labels": labels,
+            "augmented_image": augmented_image,
+            "augmented_bboxes": augmented_bboxes,
+            "augmented_labels": augmented_labels,
+            "original": self.make_preview(image, bboxes, self.preview_size),
+            "augmented": self.make_preview(augmented_image, augmented_bboxes, self.preview_size),
+        }
+
+    def save_full(self, request, directory):
+        image, bboxes, labels = request["load_full"](request["image_path"])
+        _, augmented_image, augmented_bboxes, augmented_labels = self.augment(request, image, bboxes, labels)
+        path = Utilities.write_image(augmented_image, directory)
+        # Превью сохраненного варианта; кадры для "Обнаружить" уменьшаются так же, как при обычном превью
+        result = self.make_result(
+            request, self.reduce(image), bboxes, labels, self.reduce(augmented_image), augmented_bboxes, augmented_labels
+        )
+        return path, result
+
+    def augment(self, request, image, bboxes, labels):
+        # Пайплайн собирается заново только при изменении настроек
+        key = (json.dumps(request["settings"], sort_keys=True), request["mode"])
+        if key != self._pipeline_key:
+            self._pipeline = ImageAugmentor.update_pipeline(request["settings"], request["mode"])
+            self._pipeline_key = key
+        self._pipeline.set_random_seed(request["seed"])
+        return Utilities.attempt_augmentation(self._pipeline, image, bboxes, labels)
+
+    @staticmethod
+    def read_reduced(image_path, min_size=DECODE_MIN_SIZE, size=None):
+        # Наибольшее уменьшение при декодировании, после которого длинная сторона не меньше min_size.
+        # size - (ширина, высота) из индекса датасета; без него читается заголовок файла
+        size = size or DatasetIndex.read_image_size(image_path)
+        flag = cv2.IMREAD_COLOR
+        if size is not None:
+            for factor, reduced_flag in PreviewRenderer.REDUCED_MODES:
+                if max(size) // factor >= min_size:
+                    flag = reduced_flag
+                    break
+        Utilities.open_file(image_path)
+        image = cv2.imread(image_path, flag)
+        if image is None:
+            raise ValueError("Файл не является изображением или поврежден")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    @staticmethod
+    def reduce(image, min_size=DECODE_MIN_SIZE):
+        # То же уменьшение для уже декодированных кадров (DecodedStore, шарды)
+        for factor, _ in PreviewRenderer.REDUCED_MODES:
+            if max(image.shape[:2]) // factor >= min_size:
+                height, width = image.shape[:2]
+                return cv2.resize(image, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+        return image
+
+    @staticmethod
+    def fit(image, size):
+        height, width = image.shape[:2]
+        scale = min(size / width, size / height)
+        if scale == 1:
+            return image
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=interpolation)
+
+    @staticmethod
+    def make_preview(image, bboxes, size, color=(0, 255, 0)):
+        # Рамки рисуются на уже уменьшенном кадре; QImage владеет своей копией данных
+        image = PreviewRenderer.fit(image, size)
+        if Utilities.has_boxes(bboxes):
+            image = Utilities.draw_boxes(image, bboxes, color)
+        image = image if image.flags['C_CONTIGUOUS'] else image.copy()
+        height, width = image.shape[:2]
+        return QImage(image.data, width, height, 3 * width, QImage.Format_RGB888).copy()
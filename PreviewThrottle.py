@@ -0,0 +1,35 @@
+import threading
+import time
+import cv2
+
+# Ограничение частоты превью во время пакетной аугментации: пропускает
+# не больше max_rate кадров в секунду, остальные отбрасываются и считаются
+class PreviewThrottle:
+    def __init__(self, max_rate, size):
+        self.interval = 1.0 / max_rate if max_rate else 0.0
+        self.size = size
+        self.sent = 0
+        self.skipped = 0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_time:
+                self.skipped += 1
+                return False
+            self._next_time = now + self.interval
+            self.sent += 1
+            return True
+
+    def thumbnail(self, image):
+        # Уменьшение выполняется в воркере, в GUI уходит только миниатюра
+        if not self.size:
+            return image
+
+        height, width = image.shape[:2]
+        scale = min(self.size / width, self.size / height)
+        if scale >= 1:
+            return image
+        return cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
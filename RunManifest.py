@@ -0,0 +1,80 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Журнал выполненной работы: (исходный файл, хэш конфигурации, номер варианта).
+# Строки только дописываются; при повторном запуске готовые варианты пропускаются,
+# а изменившиеся исходники (другая сигнатура) обрабатываются заново.
+# Части разбиенного запуска (WorkShard) пишут каждая свой журнал, но читают все: после
+# изменения числа частей уже сделанная другими частями работа тоже пропускается.
+class RunManifest:
+    FILE_NAME = "manifest.jsonl"
+    FILE_PATTERN = "manifest*.jsonl"
+    FLUSH_INTERVAL = 1.0    # с
+
+    def __init__(self, directory, config_hash, file_name=FILE_NAME):
+        self.path = os.path.join(directory, file_name)
+        self.config_hash = config_hash
+        # (source, config) -> (signature, множество готовых вариантов)
+        self._done = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+        for path in sorted(glob.glob(os.path.join(directory, self.FILE_PATTERN))):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    # Записи прошлых запусков с другой конфигурацией не нужны: строка даже не разбирается
+                    if self.config_hash not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Последняя строка могла оборваться при аварийном завершении (или еще дописывается)
+                        continue
+                    if entry["config"] != self.config_hash:
+                        continue
+                    self._mark(entry["source"], entry["config"], entry["signature"], entry["variant"])
+
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def config_hash(*parts):
+        data = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+    def pending_variants(self, source, signature, count):
+        with self._lock:
+            done = self._done.get((source, self.config_hash))
+        if done is None or done[0] != signature:
+            return list(range(count))
+        return [variant for variant in range(count) if variant not in done[1]]
+
+    def add(self, source, signature, variant):
+        entry = {"source": source, "config": self.config_hash, "signature": signature, "variant": variant}
+        with self._lock:
+            self._mark(source, self.config_hash, signature, variant)
+            self._file.write(json.dumps(entry) + "\n")
+            if time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+    def _mark(self, source, config, signature, variant):
+        key = (source, config)
+        done = self._done.get(key)
+        if done is None or done[0] != signature:
+            done = (signature, set())
+            self._done[key] = done
+        done[1].add(variant)
+
+    def _flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_flush = time.monotonic()
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+
+# Гистограммы времени этапов и отдельных аугментаций во время запуска.
+# Каждый поток пишет в свои гистограммы без блокировок; сводка объединяет их.
+# Корзины - степени двойки в микросекундах.
+class RunProfiler:
+    BUCKETS = 40
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        histogram = self._histograms().get(name)
+        if histogram is None:
+            histogram = self._histograms()[name] = self._empty()
+        histogram[0] += 1
+        histogram[1] += seconds
+        if seconds > histogram[2]:
+            histogram[2] = seconds
+        histogram[3][min(self.BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+    def take_snapshot(self):
+        # Гистограммы текущего потока (для передачи из процесса-воркера) с обнулением
+        histograms = self._histograms()
+        snapshot = {name: [h[0], h[1], h[2], list(h[3])] for name, h in histograms.items()}
+        histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        histograms = self._histograms()
+        for name, (count, total, maximum, buckets) in snapshot.items():
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = self._empty()
+            histogram[0] += count
+            histogram[1] += total
+            histogram[2] = max(histogram[2], maximum)
+            for index, value in enumerate(buckets):
+                histogram[3][index] += value
+
+    def report(self):
+        merged = {}
+        with self._lock:
+            per_thread = [list(histograms.items()) for histograms in self._all]
+        for items in per_thread:
+            for name, (count, total, maximum, buckets) in items:
+                histogram = merged.setdefault(name, self._empty())
+                histogram[0] += count
+                histogram[1] += total
+                histogram[2] = max(histogram[2], maximum)
+                for index, value in enumerate(buckets):
+                    histogram[3][index] += value
+
+        report = {}
+        for name, (count, total, maximum, buckets) in sorted(merged.items(), key=lambda item: -item[1][1]):
+            if not count:
+                continue
+            report[name] = {
+                "count": count,
+                "total_s": total,
+                "mean_ms": total / count * 1000,
+                "p50_ms": min(self._percentile(buckets, count, 0.50), maximum * 1000),
+                "p90_ms": min(self._percentile(buckets, count, 0.90), maximum * 1000),
+                "p99_ms": min(self._percentile(buckets, count, 0.99), maximum * 1000),
+                "max_ms": maximum * 1000,
+                "histogram_us": {str(1 << index): value for index, value in enumerate(buckets) if value},
+            }
+        return report
+
+    def write_report(self, path, extra=None):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({**(extra or {}), "timings": self.report()}, file, indent=2, ensure_ascii=False, default=str)
+
+    def wrap_pipeline(self, pipeline):
+        # Замер каждой аугментации: класс экземпляра подменяется подклассом с таймером
+        for transform in pipeline.transforms:
+            transform._profiler = self
+            transform._profile_name = f"transform.{type(transform).__name__}"
+            transform.__class__ = _timed_class(type(transform))
+        return pipeline
+
+    def _histograms(self):
+        histograms = getattr(self._local, "histograms", None)
+        if histograms is None:
+            histograms = self._local.histograms = {}
+            with self._lock:
+                self._all.append(histograms)
+        return histograms
+
+    def _empty(self):
+        return [0, 0.0, 0.0, [0] * self.BUCKETS]
+
+    @staticmethod
+    def _percentile(buckets, count, fraction):
+        # Верхняя граница корзины, в которую попадает перцентиль (оценка сверху)
+        threshold = fraction * count
+        seen = 0
+        for index, value in enumerate(buckets):
+            seen += value
+            if seen >= threshold:
+                return (1 << index) / 1000
+        return float("inf")
+
+_timed_classes = {}
+
+def _timed_class(transform_class):
+    if getattr(transform_class, "_is_timed", False):
+        return transform_class
+
+    timed = _timed_classes.get(transform_class)
+    if timed is None:
+        def __call__(transform, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return transform_class.__call__(transform, *args, **kwargs)
+            finally:
+                transform._profiler.record(transform._profile_name, time.perf_counter() - start)
+
+        timed = type(transform_class.__name__, (transform_class,), {"__call__": __call__, "_is_timed": True})
+        _timed_classes[transform_class] = timed
+    return timed
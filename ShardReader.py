@@ -0,0 +1,66 @@
+import glob
+import json
+import os
+import cv2
+import numpy
+from ShardWriter import ShardWriter
+from Utilities import Utilities
+
+# Чтение tar-шардов, записанных ShardWriter, по смещениям из index.jsonl
+# (и индексов частей разбиенного запуска index.part-*.jsonl)
+class ShardReader:
+    def __init__(self, directory):
+        self.directory = directory
+        # Более поздние записи индекса перекрывают ранние с тем же именем
+        self.entries = {}
+        for path in ShardReader.index_paths(directory):
+            with open(path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["name"]] = entry
+
+    @staticmethod
+    def index_paths(directory):
+        return sorted(glob.glob(os.path.join(directory, ShardWriter.INDEX_PATTERN)))
+
+    @staticmethod
+    def is_archive(directory):
+        return bool(ShardReader.index_paths(directory))
+
+    def has_labels(self):
+        return any("label_offset" in entry for entry in self.entries.values())
+
+    def image_paths(self):
+        # Виртуальные пути: директория архива + имя элемента
+        return [os.path.join(self.directory, name) for name in self.entries]
+
+    def signature(self, image_path):
+        stat = os.stat(os.path.join(self.directory, self._entry(image_path)["shard"]))
+        return stat.st_mtime_ns, stat.st_size
+
+    def read(self, image_path):
+        entry = self._entry(image_path)
+        data = self._read_bytes(entry["shard"], entry["offset"], entry["size"])
+        image = cv2.imdecode(numpy.frombuffer(data, dtype=numpy.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"Элемент {entry['name']} не является изображением или поврежден")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+        if "label_offset" not in entry:
+            return image, None, None
+
+        label_data = self._read_bytes(entry["shard"], entry["label_offset"], entry["label_size"])
+        bboxes, labels = Utilities.parse_yolo_labels(label_data.decode('utf-8'), entry["name"])
+        return image, bboxes, labels
+
+    def _entry(self, image_path):
+        name = os.path.basename(image_path)
+        if name not in self.entries:
+            raise FileNotFoundError(f"Элемент {name} не найден в архиве {self.directory}")
+        return self.entries[name]
+
+    def _read_bytes(self, shard, offset, size):
+        with open(os.path.join(self.directory, shard), 'rb') as file:
+            file.seek(offset)
+            return file.read(size)
@@ -0,0 +1,79 @@
+import glob
+import json
+import os
+import tarfile
+import threading
+import time
+
+# Упаковка результатов в tar-шарды ограниченного размера вместо миллионов мелких файлов.
+# Записи только дописываются в конец; index.jsonl хранит смещения данных внутри шардов.
+class ShardWriter:
+    INDEX_NAME = "index.jsonl"
+    INDEX_PATTERN = "index*.jsonl"
+    SHARD_PATTERN = "shard-{:06d}{}.tar"
+    DEFAULT_SHARD_SIZE_MB = 1024
+
+    def __init__(self, directory, shard_size_mb=DEFAULT_SHARD_SIZE_MB, work_shard=None):
+        self.directory = directory
+        self.max_shard_bytes = int(shard_size_mb * 1024 * 1024)
+        os.makedirs(directory, exist_ok=True)
+
+        # Части разбиенного запуска (WorkShard) пишут свои шарды и свой индекс в одну директорию
+        self._suffix = work_shard.suffix() if work_shard is not None else ""
+        # Повторный запуск продолжает нумерацию шардов и дописывает индекс
+        self._shard_number = len(glob.glob(os.path.join(directory, "shard-" + "[0-9]" * 6 + f"{self._suffix}.tar")))
+        self._shard = None
+        self._shard_name = None
+        self._shard_bytes = 0
+        self._index = open(os.path.join(directory, f"index{self._suffix}.jsonl"), 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def add(self, image_name, image_data, label_name=None, label_data=None):
+        label_size = len(label_data) if label_data is not None else 0
+        with self._lock:
+            self._ensure_shard(len(image_data) + label_size)
+            entry = {"name": image_name, "shard": self._shard_name}
+            entry["offset"], entry["size"] = self._append(image_name, image_data)
+            if label_data is not None:
+                entry["label_offset"], entry["label_size"] = self._append(label_name, label_data)
+
+            # Индекс пишется после данных: в нем только полностью записанные элементы
+            self._index.write(json.dumps(entry) + "\n")
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_shard()
+            self._index.close()
+
+    def _ensure_shard(self, size):
+        if self._shard is not None and self._shard_bytes + size > self.max_shard_bytes and self._shard_bytes > 0:
+            self._close_shard()
+
+        if self._shard is None:
+            self._shard_name = self.SHARD_PATTERN.format(self._shard_number, self._suffix)
+            self._shard_number += 1
+            self._shard = open(os.path.join(self.directory, self._shard_name), 'wb')
+            self._shard_bytes = 0
+
+    def _append(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        header = info.tobuf(tarfile.GNU_FORMAT)
+
+        data_offset = self._shard_bytes + len(header)
+        padding = (tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+        self._shard.write(header)
+        self._shard.write(data)
+        self._shard.write(tarfile.NUL * padding)
+        self._shard_bytes = data_offset + info.size + padding
+        return data_offset, info.size
+
+    def _close_shard(self):
+        if self._shard is None:
+            return
+        # Завершающие нулевые блоки, чтобы шард читался обычным tar
+        self._shard.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+        self._shard.close()
+        self._shard = None
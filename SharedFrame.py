@@ -0,0 +1,47 @@
+import numpy
+from multiprocessing import resource_tracker, shared_memory
+
+# Передача кадров между процессами через разделяемую память вместо pickle.
+# Между процессами передается только дескриптор (name, shape, dtype).
+class SharedFrame:
+    @staticmethod
+    def start_tracker():
+        # Вызывается в родительском процессе до запуска пула, чтобы все
+        # воркеры регистрировали сегменты в одном resource_tracker
+        resource_tracker.ensure_running()
+
+    @staticmethod
+    def put(image):
+        image = numpy.ascontiguousarray(image)
+        shm = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        try:
+            buffer = numpy.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            buffer[...] = image
+            del buffer
+            return shm.name, image.shape, image.dtype.str
+        finally:
+            shm.close()
+
+    @staticmethod
+    def take(descriptor):
+        # Копирует кадр в память текущего процесса и освобождает сегмент
+        name, shape, dtype = descriptor
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            buffer = numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=shm.buf)
+            image = buffer.copy()
+            del buffer
+            return image
+        finally:
+            shm.close()
+            shm.unlink()
+
+    @staticmethod
+    def release(descriptor):
+        # Освобождает сегмент без чтения (например, если задача отменена)
+        try:
+            shm = shared_memory.SharedMemory(name=descriptor[0])
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
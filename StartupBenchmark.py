@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Замер холодного старта GUI: импорт -> окно -> первое превью.
+# Каждый замер выполняется в отдельном процессе, результат - JSON.
+# С --baseline сравнивает с прошлым результатом и завершается с ошибкой при регрессии.
+HEAVY_MODULES = ("albumentations", "ultralytics", "torch")
+METRICS = ("import_s", "window_s", "first_preview_s", "process_s")
+PREVIEW_TIMEOUT_S = 60
+
+def measure_child(directory):
+    start = time.perf_counter()
+    from PyQt5.QtWidgets import QApplication
+    import AugmentApp
+    imported = time.perf_counter()
+
+    app = QApplication([])
+    window = AugmentApp.DataAugmentationApp()
+    window.show()
+    # Проверяется до обработки событий, чтобы не учитывать фоновую подгрузку
+    loaded_at_window = [name for name in HEAVY_MODULES if name in sys.modules]
+    app.processEvents()
+    shown = time.perf_counter()
+
+    first_preview = None
+    if directory:
+        from PyQt5.QtCore import QEventLoop, QTimer
+
+        # Превью готовится в PreviewRenderer: ждем первый показанный результат (не устаревший запрос)
+        loop = QEventLoop()
+        rendered_at = []
+        def on_rendered(result):
+            if result["token"] == window.render_token and not rendered_at:
+                rendered_at.append(time.perf_counter())
+                loop.quit()
+        window.renderer.rendered.connect(on_rendered)
+        QTimer.singleShot(PREVIEW_TIMEOUT_S * 1000, loop.quit)
+        window.open_directory(directory)
+        if not rendered_at:
+            loop.exec_()
+        first_preview = rendered_at[0] - start if rendered_at else None
+
+    return {
+        "import_s": imported - start,
+        "window_s": shown - start,
+        "first_preview_s": first_preview,
+        "heavy_modules_at_window": loaded_at_window,
+    }
+
+def run_once(directory):
+    environment = dict(os.environ)
+    environment.setdefault("QT_QPA_PLATFORM", "offscreen")
+    command = [sys.executable, os.path.abspath(__file__), "--child"]
+    if directory:
+        command += ["--directory", directory]
+
+    start = time.perf_counter()
+    output = subprocess.run(command, env=environment, capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - start
+    return result
+
+def summarize(runs):
+    summary = {"runs": len(runs), "heavy_modules_at_window": runs[-1]["heavy_modules_at_window"]}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        summary[metric] = statistics.median(values) if values else None
+    return summary
+
+def find_regressions(summary, baseline, max_regression):
+    regressions = []
+    for metric in METRICS:
+        current, previous = summary.get(metric), baseline.get(metric)
+        if current is not None and previous and current > previous * (1 + max_regression):
+            regressions.append(f"{metric}: {previous:.3f} с -> {current:.3f} с")
+    if set(summary["heavy_modules_at_window"]) - set(baseline.get("heavy_modules_at_window", [])):
+        regressions.append(f"до появления окна загружены: {summary['heavy_modules_at_window']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк холодного старта приложения")
+    parser.add_argument("--directory", default=None, help="Датасет для замера времени до первого превью")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="Сохранить результат в JSON-файл")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого замера для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Допустимое замедление (доля)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_child(args.directory)))
+        return 0
+
+    summary = summarize([run_once(args.directory) for _ in range(args.repeat)])
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            regressions = find_regressions(summary, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Регрессия: {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import threading
+from queue import Queue
+
+# Потоковый конвейер из нескольких стадий с ограниченными очередями между ними.
+# Каждая стадия - (name, function, concurrency): function(item) возвращает список
+# элементов для следующей стадии. Заполненная очередь блокирует предыдущую стадию,
+# поэтому объем памяти не зависит от размера датасета.
+class StreamingPipeline:
+    _END = object()
+
+    def __init__(self, stages, queue_size, error_callback=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.error_callback = error_callback    # error_callback(stage_name, item, exception)
+        self._stopped = threading.Event()
+
+    def run(self, items):
+        # Генератор: возвращает результаты последней стадии в вызывающем потоке.
+        # Остановка, пришедшая до запуска, сохраняется: конвейер сразу завершается
+        source = iter(items)
+        source_lock = threading.Lock()
+        queues = [Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads = []
+
+        for index, (name, function, concurrency) in enumerate(self.stages):
+            stage_state = {"remaining": concurrency, "lock": threading.Lock()}
+            for _ in range(concurrency):
+                thread = threading.Thread(
+                    target=self._stage_worker,
+                    args=(index, name, function, stage_state, source, source_lock, queues),
+                    name=f"{name}-worker",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        while True:
+            item = queues[-1].get()
+            if item is self._END:
+                break
+            yield item
+
+        for thread in threads:
+            thread.join()
+
+    def reset(self):
+        # Для повторного run() того же конвейера после stop()
+        self._stopped.clear()
+
+    def stop(self):
+        # Прекращает чтение новых элементов; уже принятые в конвейер дорабатываются
+        self._stopped.set()
+
+    def _next_item(self, index, source, source_lock, queues):
+        if index > 0:
+            return queues[index - 1].get()
+
+        with source_lock:
+            if self._stopped.is_set():
+                return self._END
+            return next(source, self._END)
+
+    def _stage_worker(self, index, name, function, stage_state, source, source_lock, queues):
+        output = queues[index]
+        while True:
+            item = self._next_item(index, source, source_lock, queues)
+            if item is self._END:
+                break
+
+            try:
+                results = function(item)
+            except Exception as e:
+                results = ()
+                if self.error_callback is not None:
+                    self.error_callback(name, item, e)
+
+            for result in results:
+                output.put(result)
+
+        # Последний завершившийся поток стадии закрывает следующую стадию
+        with stage_state["lock"]:
+            stage_state["remaining"] -= 1
+            is_last = stage_state["remaining"] == 0
+
+        if is_last:
+            next_concurrency = self.stages[index + 1][2] if index + 1 < len(self.stages) else 1
+            for _ in range(next_concurrency):
+                output.put(self._END)
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import sys
+import time
+import numpy
+from BatchAugmentor import BatchAugmentor
+from ImageAugmentor import ImageAugmentor
+from Modes import Modes
+from Utilities import Utilities
+
+# Пропускная способность каждой аугментации по отдельности (p=1) и полного пайплайна
+# на синтетических изображениях разных разрешений, с рамками и без.
+# Результат - таблица ms/изображение и изображений/с, а также JSON или CSV для сравнения версий.
+# С --variants N дополнительно сравнивается аугментация N вариантов по одному и BatchAugmentor:
+# с одинаковыми seed результаты обязаны совпадать, а ускорение показывает, стоит ли включать --batch-variants.
+FULL_PIPELINE = "<full pipeline>"
+PIXEL_PIPELINE = "<pixel-level, p=1>"
+BATCHED_TRANSFORMS = ("RandomBrightnessContrast", "RandomGamma", "HueSaturationValue", "RGBShift", "ChannelShuffle")
+DEFAULT_RESOLUTIONS = "640x480,1920x1080,4000x3000"
+FIELDS = ("transform", "resolution", "mode", "iterations", "failures", "ms_per_image", "images_per_sec")
+BATCH_FIELDS = ("pipeline", "resolution", "mode", "variants", "sequential_ms", "batched_ms", "speedup")
+
+def synthetic_sample(width, height, boxes, seed=0):
+    rng = numpy.random.default_rng(seed)
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=numpy.uint8)
+    sizes = rng.uniform(0.05, 0.3, size=(boxes, 2))
+    centers = rng.uniform(sizes / 2, 1 - sizes / 2)
+    bboxes = numpy.hstack((centers, sizes)).astype(numpy.float32)
+    labels = rng.integers(0, 10, size=boxes)
+    return image, bboxes, labels
+
+def measure(pipeline, image, bboxes, labels, iterations, warmup):
+    failures = 0
+    for _ in range(warmup):
+        try:
+            ImageAugmentor.augment_image(image, pipeline, bboxes, labels)
+        except Exception:
+            pass
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            ImageAugmentor.augment_image(image, pipeline, bboxes, labels)
+        except Exception:
+            failures += 1
+    elapsed = time.perf_counter() - start
+    return failures, elapsed / iterations
+
+def run_benchmark(transforms, resolutions, modes, iterations, warmup, probability, boxes, progress=None):
+    results = []
+    for width, height in resolutions:
+        for mode in modes:
+            with_boxes = mode == Modes.IMAGES_WITH_LABELS
+            image, bboxes, labels = synthetic_sample(width, height, boxes)
+            cases = [(name, {name: {"enabled": True, "probability": 1.0}}) for name in transforms]
+            full_settings = {name: {"enabled": True, "probability": probability} for name in transforms}
+            cases.append((FULL_PIPELINE, full_settings))
+
+            for name, settings in cases:
+                pipeline = ImageAugmentor.update_pipeline(settings, mode)
+                failures, seconds = measure(
+                    pipeline, image, bboxes if with_boxes else None, labels if with_boxes else None, iterations, warmup
+                )
+                result = {
+                    "transform": name,
+                    "resolution": f"{width}x{height}",
+                    "mode": mode.name,
+                    "iterations": iterations,
+                    "failures": failures,
+                    "ms_per_image": seconds * 1000,
+                    "images_per_sec": 1 / seconds if seconds > 0 else None,
+                }
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+def measure_variants(function, iterations, warmup):
+    for _ in range(warmup):
+        function()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+def augment_sequential(pipeline, image, bboxes, labels, seeds):
+    results = []
+    for seed in seeds:
+        pipeline.set_random_seed(seed)
+        results.append(Utilities.attempt_augmentation(pipeline, image, bboxes, labels))
+    return results
+
+def same_variant(first, second):
+    ok, image, bboxes, labels = first
+    if ok != second[0] or image.shape != second[1].shape or not numpy.array_equal(image, second[1]):
+        return False
+    if bboxes is None or second[2] is None:
+        return bboxes is None and second[2] is None
+    return numpy.allclose(numpy.asarray(bboxes), numpy.asarray(second[2])) and numpy.array_equal(numpy.asarray(labels), numpy.asarray(second[3]))
+
+def check_equivalence(name, pipeline, image, bboxes, labels, seeds):
+    # Пакетный путь - только оптимизация: с теми же seed варианты должны совпадать побайтно
+    batched = BatchAugmentor.augment_variants(pipeline, image, bboxes, labels, len(seeds), seeds=seeds)
+    sequential = augment_sequential(pipeline, image, bboxes, labels, seeds)
+    different = [seed for seed, first, second in zip(seeds, batched, sequential) if not same_variant(first, second)]
+    if different:
+        raise AssertionError(f"{name}: BatchAugmentor расходится с последовательным пайплайном для seed {different}")
+
+def run_batch_benchmark(transforms, resolutions, modes, variants, iterations, warmup, probability, boxes, progress=None):
+    results = []
+    for width, height in resolutions:
+        for mode in modes:
+            with_boxes = mode == Modes.IMAGES_WITH_LABELS
+            image, bboxes, labels = synthetic_sample(width, height, boxes)
+            bboxes, labels = (bboxes, labels) if with_boxes else (None, None)
+            cases = [
+                (PIXEL_PIPELINE, {name: {"enabled": True, "probability": 1.0} for name in BATCHED_TRANSFORMS}),
+                (FULL_PIPELINE, {name: {"enabled": True, "probability": probability} for name in transforms}),
+            ]
+
+            for name, settings in cases:
+                pipeline = ImageAugmentor.update_pipeline(settings, mode)
+                seeds = list(range(variants))
+                check_equivalence(name, pipeline, image, bboxes, labels, seeds)
+                sequential = measure_variants(
+                    lambda: augment_sequential(pipeline, image, bboxes, labels, seeds), iterations, warmup,
+                )
+                batched = measure_variants(
+                    lambda: BatchAugmentor.augment_variants(pipeline, image, bboxes, labels, variants, seeds=seeds),
+                    iterations, warmup,
+                )
+                result = {
+                    "pipeline": name,
+                    "resolution": f"{width}x{height}",
+                    "mode": mode.name,
+                    "variants": variants,
+                    "sequential_ms": sequential * 1000,
+                    "batched_ms": batched * 1000,
+                    "speedup": sequential / batched if batched > 0 else None,
+                }
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+def format_table(results):
+    lines = [f"{'transform':<26} {'resolution':>10} {'mode':>18} {'ms/img':>10} {'img/s':>9} {'fail':>5}"]
+    for result in results:
+        lines.append(
+            f"{result['transform']:<26} {result['resolution']:>10} {result['mode']:>18} "
+            f"{result['ms_per_image']:>10.2f} {result['images_per_sec'] or 0:>9.1f} {result['failures']:>5}"
+        )
+    return "\n".join(lines)
+
+def format_batch_table(results):
+    lines = [f"{'pipeline':<22} {'resolution':>10} {'mode':>18} {'N':>3} {'seq, ms':>10} {'batch, ms':>10} {'speedup':>8}"]
+    for result in results:
+        lines.append(
+            f"{result['pipeline']:<22} {result['resolution']:>10} {result['mode']:>18} {result['variants']:>3} "
+            f"{result['sequential_ms']:>10.2f} {result['batched_ms']:>10.2f} {result['speedup'] or 0:>7.2f}x"
+        )
+    return "\n".join(lines)
+
+def parse_resolutions(value):
+    return [tuple(int(side) for side in item.lower().split("x")) for item in value.split(",")]
+
+def write_csv(path, fields, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def write_results(path, results, metadata, batch_results=None):
+    if path.endswith(".csv"):
+        write_csv(path, FIELDS, results)
+        # Сравнение с BatchAugmentor - в соседний файл *_batch.csv
+        if batch_results:
+            write_csv(f"{os.path.splitext(path)[0]}_batch.csv", BATCH_FIELDS, batch_results)
+    else:
+        output = {"metadata": metadata, "results": results}
+        if batch_results:
+            output["batch"] = batch_results
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(output, file, indent=2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк пропускной способности аугментаций")
+    parser.add_argument("--transforms", default=None,
+                        help="Список через запятую (по умолчанию все из ImageAugmentor.DEFAULT_AUGMENTATIONS)")
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="Например 640x480,1920x1080")
+    parser.add_argument("--modes", default="ONLY_IMAGES,IMAGES_WITH_LABELS", help="Режимы Modes через запятую")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--probability", type=float, default=0.3, help="Вероятность каждой аугментации в полном пайплайне")
+    parser.add_argument("--boxes", type=int, default=10, help="Рамок на изображение в режиме IMAGES_WITH_LABELS")
+    parser.add_argument("--variants", type=int, default=0,
+                        help="Сравнить N вариантов по одному и через BatchAugmentor (0 - не сравнивать)")
+    parser.add_argument("--output", default=None, help="Файл результата: .json или .csv")
+    args = parser.parse_args(argv)
+
+    transforms = args.transforms.split(",") if args.transforms else ImageAugmentor.DEFAULT_AUGMENTATIONS
+    resolutions = parse_resolutions(args.resolutions)
+    modes = [Modes[name] for name in args.modes.split(",")]
+
+    results = run_benchmark(
+        transforms, resolutions, modes, args.iterations, args.warmup, args.probability, args.boxes,
+        progress=lambda result: print(f"{result['transform']} {result['resolution']} {result['mode']}: "
+                                      f"{result['ms_per_image']:.2f} ms", file=sys.stderr),
+    )
+    print(format_table(results))
+
+    batch_results = None
+    if args.variants > 0:
+        batch_results = run_batch_benchmark(
+            transforms, resolutions, modes, args.variants, args.iterations, args.warmup, args.probability, args.boxes,
+            progress=lambda result: print(f"{result['pipeline']} {result['resolution']} {result['mode']}: "
+                                          f"{result['speedup']:.2f}x", file=sys.stderr),
+        )
+        print()
+        print(format_batch_table(batch_results))
+        faster = [result for result in batch_results if result["speedup"] and result["speedup"] > 1]
+        print(f"\nBatchAugmentor быстрее в {len(faster)} из {len(batch_results)} случаев; "
+              f"--batch-variants стоит включать, только если он быстрее на ваших настройках и разрешении")
+
+    if args.output:
+        import albumentations
+        import cv2
+        metadata = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "albumentations": albumentations.__version__,
+            "opencv": cv2.__version__,
+            "numpy": numpy.__version__,
+            "iterations": args.iterations,
+            "probability": args.probability,
+            "boxes": args.boxes,
+            "variants": args.variants,
+        }
+        write_results(args.output, results, metadata, batch_results)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
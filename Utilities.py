@@ -1,33 +1,31 @@
-from PyQt5.QtWidgets import QMessageBox
-from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
 import cv2
+import io
+import numpy
 import os
+import sys
+import time
 import uuid
 from Modes import Modes
 from ImageAugmentor import ImageAugmentor
 
 class Utilities:
+    IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+    LABEL_EXTENSIONS = ('.txt',)
+    # Результаты запусков внутри датасета не индексируются как исходные изображения
+    EXCLUDED_DIRS = ("augmented_images", "augmented_labels", "augmented_shards", "auto_labeled", "saved")
+
+    # Ошибки пробрасываются вызывающему коду
     @staticmethod
-    def open_image(image_path):
-        try:
-            Utilities.open_file(image_path)
-        except FileNotFoundError as e:
-            Utilities.show_error_message(f"Ошибка: {str(e)}")
-            return None
-        except Exception as e:
-            Utilities.show_error_message(f"Неизвестная ошибка при проверке пути: {str(e)}")
-            return None
+    def read_image(image_path):
+        return cv2.cvtColor(Utilities.read_image_bgr(image_path), cv2.COLOR_BGR2RGB)
 
-        try:
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError("Файл не является изображением или поврежден")
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            return image
-        except Exception as e:
-            Utilities.show_error_message(f"Ошибка при загрузке изображения: {str(e)}")
-            return None
+    @staticmethod
+    def read_image_bgr(image_path):
+        Utilities.open_file(image_path)
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError("Файл не является изображением или поврежден")
+        return image
 
     @staticmethod
     def open_file(path):
@@ -36,6 +34,10 @@ class Utilities:
 
     @staticmethod
     def show_error_message(message):
+        if not Utilities.is_gui_thread():
+            print(message, file=sys.stderr)
+            return
+        from PyQt5.QtWidgets import QMessageBox
         msg_box = QMessageBox()
         msg_box.setIcon(QMessageBox.Critical)
         msg_box.setWindowTitle("Ошибка")
@@ -44,12 +46,28 @@ class Utilities:
 
     @staticmethod
     def show_message(message):
+        if not Utilities.is_gui_thread():
+            print(message, file=sys.stderr)
+            return
+        from PyQt5.QtWidgets import QMessageBox
         msg_box = QMessageBox()
         msg_box.setIcon(QMessageBox.Information)
         msg_box.setWindowTitle("сообщение")
         msg_box.setText(message)
         msg_box.exec_() 
 
+    @staticmethod
+    def is_gui_thread():
+        # Модальный диалог из воркера останавливает его (и весь конвейер) до нажатия OK;
+        # вне GUI-потока сообщение только печатается. Без уже загруженного PyQt5 (CLI, процессы-воркеры)
+        # GUI нет, и Qt не импортируется ради одной проверки
+        if "PyQt5" not in sys.modules:
+            return False
+        from PyQt5.QtCore import QThread
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance()
+        return app is not None and QThread.currentThread() is app.thread()
+
     @staticmethod
     def determine_mode(directory):
         images_dir = os.path.join(directory, "images")
@@ -61,7 +79,29 @@ class Utilities:
             return Modes.ONLY_IMAGES
 
     @staticmethod
-    def process_labels(mode, directory, image_path):
+    def images_root(directory, mode):
+        return os.path.join(directory, "images") if mode == Modes.IMAGES_WITH_LABELS else directory
+
+    @staticmethod
+    def list_images(directory, mode):
+        # Для больших датасетов - DatasetIndex: тот же обход, но с сохранением между запусками
+        return sorted(entry.path for entry in Utilities.walk_files(Utilities.images_root(directory, mode), Utilities.IMAGE_EXTENSIONS))
+
+    @staticmethod
+    def walk_files(root, extensions):
+        # Рекурсивный обход os.scandir; скрытые и выходные директории пропускаются
+        stack = [root]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.') and entry.name not in Utilities.EXCLUDED_DIRS:
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(extensions):
+                        yield entry
+
+    @staticmethod
+    def load_labels(mode, directory, image_path):
         if mode != Modes.IMAGES_WITH_LABELS:
             return None, None
 
@@ -69,40 +109,82 @@ class Utilities:
         if not os.path.exists(label_path):
             return None, None
 
-        try:
-            bboxes, labels = Utilities.read_yolo_labels(label_path)
-            return bboxes, labels
-        except Exception as e:
-            Utilities.show_error_message(f"Error reading labels from {label_path}: {e}")
-            return None, None
+        return Utilities.read_yolo_labels(label_path)
+
+    @staticmethod
+    def file_signature(path):
+        # [mtime_ns, size] или None, если файла нет
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @staticmethod
+    def sources_signature(mode, directory, image_path):
+        # Признак изменения исходных файлов изображения и его разметки
+        return [
+            Utilities.file_signature(image_path),
+            Utilities.file_signature(Utilities.get_labels_path(directory, image_path)) if mode == Modes.IMAGES_WITH_LABELS else None,
+        ]
 
     @staticmethod
     def get_labels_path(directory, image_path):
-        return os.path.join(
-            directory, "labels", 
-            os.path.basename(image_path).replace(".jpg", ".txt").replace(".jpeg", ".txt").replace(".png", ".txt").replace(".bmp", ".txt")
-        )
+        # images/a/b/x.jpg -> labels/a/b/x.txt; изображения вне images/ - по имени файла
+        try:
+            relative = os.path.relpath(image_path, os.path.join(directory, "images"))
+        except ValueError:
+            relative = os.path.basename(image_path)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            relative = os.path.basename(image_path)
+        return os.path.join(directory, "labels", os.path.splitext(relative)[0] + ".txt")
     
     @staticmethod
     def read_yolo_labels(label_path):
         with open(label_path, 'r') as file:
-            lines = file.readlines()
+            return Utilities.parse_yolo_labels(file.read(), label_path)
 
-        bboxes = []
-        labels = []
-        for line in lines:
-            class_id, x_center, y_center, width, height = map(float, line.strip().split())
-            labels.append(int(class_id))
-            bboxes.append([x_center, y_center, width, height])
+    @staticmethod
+    def parse_yolo_labels(text, source="<labels>"):
+        # Возвращает массив рамок N×4 (float32) и массив классов N (int64)
+        if not text.strip():
+            return numpy.zeros((0, 4), dtype=numpy.float32), numpy.zeros((0,), dtype=numpy.int64)
+
+        try:
+            data = numpy.loadtxt(io.StringIO(text), dtype=numpy.float64, ndmin=2)
+        except ValueError as e:
+            raise ValueError(f"Некорректная разметка в {source}: {e}") from e
+
+        if data.shape[1] != 5:
+            raise ValueError(f"Некорректная разметка в {source}: ожидается 5 значений в строке, получено {data.shape[1]}")
+
+        invalid = ~numpy.isfinite(data).all(axis=1)
+        classes = data[:, 0]
+        invalid |= (classes < 0) | (classes != numpy.floor(classes))
+        if invalid.any():
+            row = int(numpy.argmax(invalid))
+            raise ValueError(f"Некорректная разметка в {source}: запись {row + 1}: {data[row].tolist()}")
+
+        return data[:, 1:].astype(numpy.float32), classes.astype(numpy.int64)
 
-        return bboxes, labels
-    
     @staticmethod
     def save_yolo_labels(label_path, bboxes, labels):
         with open(label_path, 'w') as file:
-            for bbox, label in zip(bboxes, labels):
-                x_center, y_center, width, height = bbox
-                file.write(f"{label} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}\n")
+            file.write(Utilities.format_yolo_labels(bboxes, labels))
+
+    @staticmethod
+    def format_yolo_labels(bboxes, labels):
+        bboxes = numpy.asarray(bboxes, dtype=numpy.float64).reshape(-1, 4)
+        labels = numpy.asarray(labels).reshape(-1)
+        if len(bboxes) == 0:
+            return ""
+
+        buffer = io.StringIO()
+        numpy.savetxt(buffer, numpy.column_stack((labels, bboxes)), fmt=["%d"] + ["%.6f"] * 4)
+        return buffer.getvalue()
+
+    @staticmethod
+    def has_boxes(bboxes):
+        return bboxes is not None and len(bboxes) > 0
 
     @staticmethod
     def draw_boxes(image, bboxes, color=(0, 255, 0), thickness=2):
@@ -120,43 +202,58 @@ class Utilities:
     
     @staticmethod
     def numpy_to_pixmap(image, preview_width, preview_height):
+        from PyQt5.QtGui import QPixmap, QImage
+        from PyQt5.QtCore import Qt
         height, width, _ = image.shape
         bytes_per_line = 3 * width
         q_image = QPixmap(QImage(image.data, width, height, bytes_per_line, QImage.Format_RGB888))
         return q_image.scaled(preview_width, preview_height, Qt.KeepAspectRatio)
     
     @staticmethod
-    def attempt_augmentation(pipeline, image, bboxes, labels, attempts=3):
+    def attempt_augmentation(pipeline, image, bboxes, labels, attempts=3, profiler=None, failures=None):
+        # failures - список, в который дописывается описание каждой неудачной попытки
         for attempt in range(attempts):
+            start = time.perf_counter() if profiler is not None else None
             try:
                 return True, *ImageAugmentor.augment_image(image, pipeline, bboxes, labels)
             except Exception as e:
+                # Время неудачных попыток учитывается отдельно
+                if profiler is not None:
+                    profiler.record("augment.failed_attempt", time.perf_counter() - start)
+                if failures is not None:
+                    failures.append(f"{type(e).__name__}: {e}")
                 if attempt < attempts - 1:
                     continue
                 return False, image, None, None
             
     @staticmethod
-    def save_augm(mode, iter, image_path, output_images_dir, output_labels_dir, augmented_image, augmented_bboxes, augmented_labels):
-        base_name, ext = os.path.splitext(os.path.basename(image_path))
-        new_image_name = f"aug_{iter}_{os.path.basename(image_path)}"
-        new_image_path = os.path.join(output_images_dir, new_image_name)
+    def get_augm_names(iter, image_path, ext=None, root=None):
+        # root - корень исходников: для вложенных папок имя включает относительный путь
+        # (a/b/x.jpg -> aug_0_a__b__x.jpg), чтобы одинаковые имена файлов в разных папках не совпали
+        relative = os.path.basename(image_path)
+        if root is not None:
+            try:
+                nested = os.path.relpath(image_path, root)
+            except ValueError:
+                nested = relative
+            if nested != os.pardir and not nested.startswith(os.pardir + os.sep):
+                relative = nested
+        base_name, source_ext = os.path.splitext(relative)
+        base_name = base_name.replace(os.sep, "__").replace("/", "__")
+        ext = source_ext if ext is None else ext
+        return f"aug_{iter}_{base_name}{ext}", f"aug_{iter}_{base_name}.txt"
+
+    @staticmethod
+    def write_bytes(path, data):
+        with open(path, 'wb') as file:
+            file.write(data)
 
-        Utilities.save_image(augmented_image, new_image_path)
+    @staticmethod
+    def write_image(image, path):
+        if not os.path.splitext(path)[1]:
+            file_name = f"{uuid.uuid4()}.png"
+            path = os.path.join(path, file_name)
 
-        if mode == Modes.IMAGES_WITH_LABELS and augmented_bboxes and augmented_labels:
-            new_label_name = f"aug_{iter}_{base_name}.txt"
-            new_label_path = os.path.join(output_labels_dir, new_label_name)
-            Utilities.save_yolo_labels(new_label_path, augmented_bboxes, augmented_labels)
-            
-    @staticmethod        
-    def save_image(image, path):
-        try:
-            if not os.path.splitext(path)[1]:
-                file_name = f"{uuid.uuid4()}.png"
-                path = os.path.join(path, file_name)
-                
-            cv2.imwrite(path, image)
-            return True
-        except Exception as e:
-            Utilities.show_error_message(f"Ошибка сохранения: {e}")
-            return False        
\ No newline at end of file
+        if not cv2.imwrite(path, image):
+            raise IOError(f"Не удалось записать файл {path}")
+        return path
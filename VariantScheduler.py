@@ -0,0 +1,131 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy
+
+# План числа вариантов для каждого изображения, рассчитываемый до запуска.
+# Вес изображения - вес самого редкого класса на нем: (1 / доля изображений с классом) ** power,
+# как в repeat factor sampling. Бюджет (всего вариантов или мегапикселей) делится пропорционально
+# весам с ограничением [min_variants, max_variants], дробные остатки раздаются по убыванию.
+class VariantScheduler:
+    DEFAULT_POWER = 0.5
+    DEFAULT_MAX_VARIANTS = 20
+    PLAN_NAME = "variant_plan.json"
+    _SEARCH_STEPS = 60
+
+    def __init__(self, image_paths, counts, weights, classes):
+        self.image_paths = image_paths
+        self.counts = counts        # numpy-массив: вариантов на изображение
+        self.weights = weights
+        self.classes = classes      # Классы на каждом изображении (массивы) или None
+
+    @staticmethod
+    def plan(image_paths, load_classes=None, total_variants=None, budget=None, costs=None, balance=True,
+             min_variants=0, max_variants=DEFAULT_MAX_VARIANTS, power=DEFAULT_POWER, readers=1, hardness=None):
+        # load_classes(image_path) -> классы рамок или None; budget - в единицах costs (по умолчанию 1 на вариант);
+        # hardness - множитель веса каждого изображения (HardExampleMiner), 0 - изображение не аугментируется
+        if balance and load_classes is not None:
+            with ThreadPoolExecutor(max_workers=max(1, readers)) as executor:
+                classes = list(executor.map(lambda path: VariantScheduler._load(load_classes, path), image_paths))
+        else:
+            classes = [None] * len(image_paths)
+
+        weights = VariantScheduler.image_weights(classes, power)
+        if hardness is not None:
+            weights = weights * numpy.asarray(hardness, dtype=numpy.float64)
+        costs = numpy.ones(len(image_paths)) if costs is None else numpy.asarray(costs, dtype=numpy.float64)
+        if budget is None:
+            budget = float(total_variants)
+        counts = VariantScheduler.allocate(weights, costs, budget, min_variants, max_variants)
+        return VariantScheduler(image_paths, counts, weights, classes)
+
+    @staticmethod
+    def _load(load_classes, image_path):
+        # Нечитаемая разметка не мешает плану: изображение получает вес обычного
+        try:
+            classes = load_classes(image_path)
+        except Exception:
+            return None
+        return None if classes is None else numpy.unique(numpy.asarray(classes, dtype=numpy.int64))
+
+    @staticmethod
+    def image_weights(classes, power=DEFAULT_POWER):
+        present = [image_classes for image_classes in classes if image_classes is not None and len(image_classes)]
+        if not present:
+            return numpy.ones(len(classes))
+
+        all_classes = numpy.concatenate(present)
+        frequency = numpy.bincount(all_classes) / len(present)
+        class_weights = numpy.zeros_like(frequency)
+        seen = frequency > 0
+        class_weights[seen] = (1.0 / frequency[seen]) ** power
+        # Изображения без рамок весят как самый частый класс
+        base = class_weights[seen].min()
+        return numpy.array([
+            class_weights[image_classes].max() if image_classes is not None and len(image_classes) else base
+            for image_classes in classes
+        ])
+
+    @staticmethod
+    def allocate(weights, costs, budget, min_variants=0, max_variants=DEFAULT_MAX_VARIANTS):
+        # Целые counts: sum(counts * costs) <= budget, counts ~ scale * weights в пределах [min, max]
+        weights = numpy.asarray(weights, dtype=numpy.float64)
+        costs = numpy.asarray(costs, dtype=numpy.float64)
+        if not len(weights):
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        def spent(scale):
+            return (numpy.clip(scale * weights, min_variants, max_variants) * costs).sum()
+
+        # Масштаб весов ищется делением пополам: затраты монотонно растут с масштабом
+        low, high = 0.0, max_variants / weights[weights > 0].min() if (weights > 0).any() else 0.0
+        if spent(high) <= budget:
+            low = high
+        else:
+            for _ in range(VariantScheduler._SEARCH_STEPS):
+                middle = (low + high) / 2
+                if spent(middle) <= budget:
+                    low = middle
+                else:
+                    high = middle
+
+        exact = numpy.clip(low * weights, min_variants, max_variants)
+        counts = numpy.floor(exact).astype(numpy.int64)
+        left = budget - (counts * costs).sum()
+        # Остаток бюджета - изображениям с наибольшей дробной частью; изображения с нулевым весом
+        # его не получают, даже если остальные уже достигли max_variants
+        for index in numpy.argsort(-(exact - counts), kind="stable"):
+            if left <= 0:
+                break
+            if weights[index] > 0 and counts[index] < max_variants and costs[index] <= left:
+                counts[index] += 1
+                left -= costs[index]
+        return counts
+
+    def total(self):
+        return int(self.counts.sum())
+
+    def summary(self):
+        # Для каждого класса: изображений с ним в исходнике и запланированных вариантов этих изображений
+        per_class = {}
+        for image_classes, count in zip(self.classes, self.counts):
+            if image_classes is None:
+                continue
+            for class_id in image_classes.tolist():
+                entry = per_class.setdefault(class_id, {"images": 0, "planned_variants": 0})
+                entry["images"] += 1
+                entry["planned_variants"] += int(count)
+        return {
+            "images": len(self.image_paths),
+            "scheduled_images": int((self.counts > 0).sum()),
+            "variants": self.total(),
+            "max_per_image": int(self.counts.max()) if len(self.counts) else 0,
+            "classes": {str(class_id): per_class[class_id] for class_id in sorted(per_class)},
+        }
+
+    def write(self, path, relative_name=None):
+        relative_name = relative_name or (lambda image_path: image_path)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({
+                **self.summary(),
+                "counts": {relative_name(image_path): int(count) for image_path, count in zip(self.image_paths, self.counts)},
+            }, file, indent=2, ensure_ascii=False)
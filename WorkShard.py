@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+# Детерминированное разбиение датасета между процессами и машинами, запущенными на одной директории.
+# Изображение относится к части по хэшу своего относительного пути (с "/" как разделителем), поэтому
+# разбиение не зависит от порядка обхода, платформы и от того, какие файлы видят другие процессы.
+# Служебные файлы каждой части (журнал, отчеты, индекс tar-шардов) получают суффикс части.
+class WorkShard:
+    def __init__(self, index=0, count=1):
+        if count < 1:
+            raise ValueError("Число частей должно быть не меньше 1")
+        if not 0 <= index < count:
+            raise ValueError(f"Номер части должен быть от 0 до {count - 1}")
+        self.index = index
+        self.count = count
+
+    @staticmethod
+    def key(relative):
+        return relative.replace(os.sep, "/")
+
+    def owns(self, relative):
+        if self.count == 1:
+            return True
+        digest = hashlib.blake2b(self.key(relative).encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % self.count == self.index
+
+    def select(self, directory, image_paths):
+        return [image_path for image_path in image_paths if self.owns(os.path.relpath(image_path, directory))]
+
+    def suffix(self):
+        # Без разбиения имена файлов не меняются
+        return f".part-{self.index:03d}-of-{self.count:03d}" if self.count > 1 else ""
+
+    def file_name(self, name):
+        # manifest.jsonl -> manifest.part-002-of-008.jsonl
+        base, ext = os.path.splitext(name)
+        return f"{base}{self.suffix()}{ext}"
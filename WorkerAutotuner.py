@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+import cv2
+
+# Автоподбор числа воркеров аугментации и внутренних потоков OpenCV/BLAS.
+# Первая часть запуска делится на пробы: каждая конфигурация (воркеры, потоки библиотек)
+# работает на нескольких вариантах, замеряется пропускная способность, затем
+# до конца запуска фиксируется лучшая. Воркеры запускаются с запасом,
+# а число одновременно работающих ограничивается слотами.
+class WorkerAutotuner:
+    MAX_WORKERS = 64
+    TUNING_FRACTION = 0.25      # Доля запуска, отводимая на пробы
+    MIN_TRIAL_ITEMS = 8         # Меньше вариантов на пробу - замер слишком шумный, автоподбор не идет
+
+    def __init__(self, total_items, cpu_count=None):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.candidates = self.make_candidates(self.cpu_count, self.MAX_WORKERS)
+        self.max_workers = max(workers for workers, _ in self.candidates)
+        self.trial_items = int(total_items * self.TUNING_FRACTION) // len(self.candidates)
+        self.tuning = len(self.candidates) > 1 and self.trial_items >= self.MIN_TRIAL_ITEMS
+        self.trials = []
+        self._initial_cv_threads = cv2.getNumThreads()
+        self._library_limits = None     # Первый ограничитель threadpoolctl помнит исходные лимиты BLAS
+        self._condition = threading.Condition()
+        self._active = 0
+        self._trial = 0
+        self._seen = 0
+        self._trial_start = None
+
+        if self.tuning:
+            self._apply(*self.candidates[0])
+        else:
+            self._apply(min(self.cpu_count, self.MAX_WORKERS), 1)
+
+    @staticmethod
+    def make_candidates(cpu_count, max_workers):
+        # Меньше воркеров - больше потоков OpenCV на каждого, и наоборот
+        counts = sorted({min(max_workers, count) for count in (1, max(1, cpu_count // 2), cpu_count, cpu_count * 2)})
+        candidates = []
+        for workers in counts:
+            candidates.append((workers, 1))
+            if cpu_count // workers > 1:
+                candidates.append((workers, cpu_count // workers))
+        return candidates
+
+    @staticmethod
+    def set_library_threads(count):
+        # Возвращает ограничитель threadpoolctl (None без threadpoolctl) для восстановления лимитов
+        cv2.setNumThreads(count)
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return None
+        return threadpool_limits(limits=count)
+
+    @contextmanager
+    def slot(self):
+        with self._condition:
+            while self._active >= self.workers:
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._condition.notify()
+
+    def record(self, count=1):
+        # Вызывается после каждого обработанного варианта
+        if not self.tuning:
+            return
+        with self._condition:
+            if not self.tuning:
+                return
+            self._seen += count
+            # Первые варианты пробы еще обработаны прошлой конфигурацией
+            if self._trial_start is None:
+                if self._seen >= self.workers:
+                    self._seen = 0
+                    self._trial_start = time.perf_counter()
+                return
+            if self._seen < self.trial_items:
+                return
+
+            elapsed = time.perf_counter() - self._trial_start
+            workers, library_threads = self.candidates[self._trial]
+            self.trials.append({
+                "workers": workers,
+                "library_threads": library_threads,
+                "items_per_sec": self._seen / elapsed if elapsed > 0 else float("inf"),
+            })
+            self._trial += 1
+            self._seen = 0
+            self._trial_start = None
+            if self._trial < len(self.candidates):
+                self._apply(*self.candidates[self._trial])
+            else:
+                best = max(self.trials, key=lambda trial: trial["items_per_sec"])
+                self.tuning = False
+                self._apply(best["workers"], best["library_threads"])
+
+    def restore(self):
+        cv2.setNumThreads(self._initial_cv_threads)
+        if self._library_limits is not None:
+            self._library_limits.restore_original_limits()
+            self._library_limits = None
+
+    def report(self):
+        return {
+            "workers": self.workers,
+            "library_threads": self.library_threads,
+            "cpu_count": self.cpu_count,
+            "tuned": bool(self.trials) and not self.tuning,
+            "trials": list(self.trials),
+        }
+
+    def _apply(self, workers, library_threads):
+        self.workers = workers
+        self.library_threads = library_threads
+        limits = self.set_library_threads(library_threads)
+        if self._library_limits is None:
+            self._library_limits = limits
+        with self._condition:
+            self._condition.notify_all()
@@ -1,40 +1,49 @@
-from ultralytics import YOLO
-from Utilities import Utilities
-
-class YoloModel:
-    DEFAULT_MODEL = "yolo11n.pt"
-    
-    def __init__(self):
-        self.model = None
-        
-    def load_weights(self, weights_path=None):
-        try:
-            if weights_path is None:
-                weights_path = self.DEFAULT_MODEL
-            self.model = YOLO(weights_path)
-            Utilities.show_message(f"Модель {weights_path} загружена успешно!")
-            return True
-        except Exception as e:
-            Utilities.show_error_message(f"Ошибка загрузки весов по пути: {weights_path}")
-            return False
-        
-    def detect(self, image):
-        if self.model is None:
-            self.load_weights()
-            
-        try:
-            results = self.model(image)
-            
-            bboxes = []
-            for result in results:
-                for box in result.boxes:
-                    bboxes.append(box.xywhn[0])
-            
-            if bboxes == []:
-                Utilities.show_message("Ничего не обнаружено")
-                
-            return True, image, bboxes
-            
-        except Exception as e:
-            Utilities.show_error_message(f"Ошибка обнаружения: {e}")
-            return False, image, None
\ No newline at end of file
+import threading
+import numpy
+
+# ultralytics (и torch) импортируются только при первой загрузке весов
+class YoloModel:
+    DEFAULT_MODEL = "yolo11n.pt"
+    WARM_UP_SIZE = 640
+    
+    def __init__(self):
+        self.model = None
+        self.weights_path = None
+        self._lock = threading.RLock()     # Модель не используется из нескольких потоков одновременно
+        
+    def load(self, weights_path=DEFAULT_MODEL):
+        from ultralytics import YOLO
+
+        with self._lock:
+            self.model = YOLO(weights_path)
+            self.weights_path = weights_path
+
+    def warm_up(self):
+        # Первый инференс инициализирует модель; после него predict отвечает быстро
+        with self._lock:
+            if self.model is None:
+                self.load()
+            self.model(numpy.zeros((self.WARM_UP_SIZE, self.WARM_UP_SIZE, 3), dtype=numpy.uint8), verbose=False)
+
+    # Рамки N×4 (xywhn) и классы; ошибки пробрасываются вызывающему коду
+    def predict(self, image):
+        with self._lock:
+            if self.model is None:
+                self.load()
+            results = self.model(image, verbose=False)
+        return (
+            numpy.concatenate([result.boxes.xywhn.cpu().numpy() for result in results]).reshape(-1, 4),
+            numpy.concatenate([result.boxes.cls.cpu().numpy().astype(int) for result in results]),
+        )
+
+    def detect_batch(self, images, confidence, device="cpu"):
+        # Пакетный инференс: для каждого изображения массив рамок N×4 (xywhn) и массив классов
+        if self.model is None:
+            self.load()
+
+        with self._lock:
+            results = self.model(images, conf=confidence, device=device, verbose=False)
+        return [
+            (result.boxes.xywhn.cpu().numpy(), result.boxes.cls.cpu().numpy().astype(int))
+            for result in results
+        ]
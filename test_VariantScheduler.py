@@ -0,0 +1,19 @@
+from VariantScheduler import VariantScheduler
+
+
+def test_allocate_saturated_budget_skips_zero_weights():
+    # Бюджет больше, чем могут взять изображения с ненулевым весом: остаток не раздается остальным
+    counts = VariantScheduler.allocate([1, 0, 0, 0], [1, 1, 1, 1], 30)
+    assert counts.tolist() == [VariantScheduler.DEFAULT_MAX_VARIANTS, 0, 0, 0]
+
+
+def test_allocate_saturated_budget_keeps_min_variants():
+    counts = VariantScheduler.allocate([1, 0, 0, 0], [1, 1, 1, 1], 30, min_variants=2)
+    assert counts.tolist() == [VariantScheduler.DEFAULT_MAX_VARIANTS, 2, 2, 2]
+
+
+def test_allocate_stays_within_budget():
+    costs = [1, 2, 1, 1]
+    counts = VariantScheduler.allocate([3, 1, 0, 2], costs, 17)
+    assert sum(count * cost for count, cost in zip(counts.tolist(), costs)) <= 17
+    assert counts[2] == 0